@@ -0,0 +1,132 @@
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+
+import degrees
+from fuzzy import POLICIES
+from graph import SearchStats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer degrees of separation queries in bulk."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument(
+        "queries", nargs="?",
+        help="CSV file of source,target names (default: stdin)"
+    )
+    parser.add_argument(
+        "--names", choices=POLICIES, default="exact",
+        help="how to resolve names that are misspelled or ambiguous"
+    )
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="include search counters and timings with each path"
+    )
+    parser.add_argument(
+        "--landmarks", type=int, default=0, metavar="K",
+        help="prune searches with an index of K landmark people"
+    )
+    args = parser.parse_args()
+
+    print("Loading data...", file=sys.stderr)
+    degrees.load_data(args.directory)
+    if args.landmarks:
+        degrees.load_landmarks(args.directory, args.landmarks)
+    print("Data loaded.", file=sys.stderr)
+
+    if args.queries is not None:
+        with open(args.queries, encoding="utf-8", newline="") as f:
+            count, seconds = run(f, sys.stdout, args.names, args.stats)
+    else:
+        count, seconds = run(sys.stdin, sys.stdout, args.names, args.stats)
+
+    rate = count / seconds if seconds else 0
+    print(
+        f"{count} queries in {seconds:.3f}s ({rate:.1f} queries/sec)",
+        file=sys.stderr
+    )
+
+
+def run(lines, output, policy="exact", stats=False):
+    """
+    Answers every "source,target" pair of names in `lines`, writing one
+    JSON object per line to `output`. Returns the number of queries and
+    the seconds spent answering them.
+    """
+    count = 0
+    start = time.perf_counter()
+    for row in csv.reader(lines):
+        if not row or not "".join(row).strip():
+            continue
+        if len(row) != 2:
+            result = {"error": "Expected two names.", "row": row}
+        else:
+            result = answer(
+                row[0].strip(), row[1].strip(), policy, stats
+            )
+        output.write(json.dumps(result) + "\n")
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def answer(source_name, target_name, policy="exact", stats=False):
+    """
+    Returns a JSON-ready dictionary describing the shortest path
+    between two people given by name, resolving names with `policy`.
+    With `stats`, it also holds the search's `SearchStats` counters, and
+    with a landmark index loaded, the pair's `bounds`.
+    """
+    result = {"source": source_name, "target": target_name}
+
+    ids = []
+    for name in (source_name, target_name):
+        person_id, candidates = degrees.resolve_name(name, policy)
+        if person_id is None:
+            if candidates:
+                result["error"] = f"Ambiguous name: {name}"
+                result["candidates"] = candidates
+            else:
+                result["error"] = f"Person not found: {name}"
+            return result
+        ids.append(person_id)
+
+    result["source_id"], result["target_id"] = ids
+    bounds = degrees.distance_bounds(ids[0], ids[1])
+    if bounds is not None:
+        # JSON has no infinity, so disconnected pairs get nulls
+        result["bounds"] = [
+            None if bound == math.inf else bound for bound in bounds
+        ]
+
+    search_stats = SearchStats() if stats else None
+    path = degrees.shortest_path(
+        ids[0], ids[1], bidirectional=True, stats=search_stats
+    )
+    if search_stats is not None:
+        result["stats"] = search_stats.as_dict()
+    if path is None:
+        result["degrees"] = None
+        result["path"] = None
+        return result
+
+    graph = degrees.graph
+    result["degrees"] = len(path)
+    result["path"] = [
+        {
+            "movie_id": movie_id,
+            "title": graph.movie_titles[graph.movie_index[movie_id]],
+            "person_id": person_id,
+            "name": graph.person_names[graph.person_index[person_id]],
+        }
+        for movie_id, person_id in path
+    ]
+    return result
+
+
+if __name__ == "__main__":
+    main()
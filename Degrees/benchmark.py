@@ -0,0 +1,233 @@
+import csv
+import http.client
+import io
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import batch
+import degrees
+import server
+from graph import Graph, SearchStats
+from landmarks import LandmarkIndex
+
+# Landmarks indexed when comparing the pruned search
+LANDMARKS = 16
+
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python benchmark.py [directory]")
+    directory = sys.argv[1] if len(sys.argv) == 2 else "small"
+
+    print(f"Measuring loaders on {directory}...")
+    compare_loaders(directory)
+
+    print(f"Loading {directory}...")
+    degrees.load_data(directory)
+    compare_searches(directory, sample_pairs(100))
+    throughput(directory, sample_pairs(200))
+
+    print("Generating synthetic graph...")
+    synthetic_graph(people=50000, movies=20000, cast=(2, 8))
+    compare_searches("synthetic", sample_pairs(50))
+    throughput("synthetic", sample_pairs(500))
+
+
+def compare_loaders(directory):
+    """
+    Prints wall time, peak traced memory and retained memory of the
+    original dictionary loader and of `degrees.parse_data`.
+    """
+    for name, loader in [
+        ("dict", dict_load_data),
+        ("streaming", degrees.parse_data),
+    ]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        data = loader(directory)
+        seconds = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del data
+        print(
+            f"{directory:>12} {name:>14}: {peak / 2 ** 20:8.1f} MiB peak, "
+            f"{retained / 2 ** 20:8.1f} MiB retained, {seconds:6.2f}s"
+        )
+
+
+def dict_load_data(directory):
+    """
+    The original loader, kept as a baseline: returns (names, people,
+    movies) as nested dictionaries and sets keyed by IMDB id.
+    """
+    names, people, movies = {}, {}, {}
+    with open(f"{directory}/people.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            people[row["id"]] = {
+                "name": row["name"],
+                "birth": row["birth"],
+                "movies": set()
+            }
+            names.setdefault(row["name"].lower(), set()).add(row["id"])
+
+    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            movies[row["id"]] = {
+                "title": row["title"],
+                "year": row["year"],
+                "stars": set()
+            }
+
+    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                people[row["person_id"]]["movies"].add(row["movie_id"])
+                movies[row["movie_id"]]["stars"].add(row["person_id"])
+            except KeyError:
+                pass
+    return names, people, movies
+
+
+def synthetic_graph(people, movies, cast, seed=0):
+    """
+    Replaces the loaded dataset with a random graph of `people` actors
+    and `movies` movies, each movie starring between `cast[0]` and
+    `cast[1]` of them.
+    """
+    rng = random.Random(seed)
+    stars = []
+    for movie in range(movies):
+        for person in rng.sample(range(people), rng.randint(*cast)):
+            stars.append((str(person), f"m{movie}"))
+    degrees.use_graph(Graph(
+        [(str(i), f"Person {i}", "") for i in range(people)],
+        [(f"m{i}", f"Movie {i}", "") for i in range(movies)],
+        stars
+    ))
+
+
+def sample_pairs(n, seed=1):
+    """
+    Returns `n` random (source, target) pairs of people with at least
+    one movie.
+    """
+    rng = random.Random(seed)
+    graph = degrees.graph
+    candidates = [
+        graph.person_ids[person] for person in range(len(graph.person_ids))
+        if len(graph.movies_for(person)) > 0
+    ]
+    return [
+        (rng.choice(candidates), rng.choice(candidates))
+        for _ in range(n)
+    ]
+
+
+def compare_searches(label, pairs):
+    """
+    Runs every pair through the one-sided and bidirectional searches
+    and the search pruned by a landmark index, checks they agree on path
+    length with plain breadth-first search and prints per-query nodes
+    expanded, people reached, peak frontier and wall time for each.
+    A few pairs of a person with themself are added, which every search
+    must answer with an empty path.
+    """
+    pairs = pairs + [(source, source) for source, _ in pairs[:5]]
+    index = LandmarkIndex.build(degrees.graph, LANDMARKS)
+    results = {}
+    for name, search, landmarks in [
+        ("bfs", degrees.shortest_path, None),
+        ("bidirectional", degrees.bidirectional_shortest_path, None),
+        ("landmarks", degrees.shortest_path, index),
+    ]:
+        degrees.landmark_index = landmarks
+        stats, lengths = measure(search, pairs)
+        results[name] = lengths
+        print(
+            f"{label:>12} {name:>14}: "
+            f"{stats.expanded / stats.queries:10.1f} expanded, "
+            f"{stats.reached / stats.queries:10.1f} reached, "
+            f"peak frontier {stats.frontier_peak:7d}, "
+            f"{1000 * stats.seconds / stats.queries:8.3f} ms/query"
+        )
+    degrees.landmark_index = None
+    if any(lengths != results["bfs"] for lengths in results.values()):
+        sys.exit("Searches disagree on path length.")
+
+
+def throughput(label, pairs, clients=(1, 4, 8)):
+    """
+    Prints queries/sec answered by batch mode and by the HTTP server
+    with several concurrent clients, for the given pairs of person ids.
+    """
+    graph = degrees.graph
+    named = [
+        (graph.person_names[graph.person_index[source]],
+         graph.person_names[graph.person_index[target]])
+        for source, target in pairs
+    ]
+
+    lines = io.StringIO()
+    csv.writer(lines).writerows(named)
+    lines.seek(0)
+    count, seconds = batch.run(lines, io.StringIO())
+    print(f"{label:>12} {'batch':>14}: {count / seconds:10.1f} queries/sec")
+
+    httpd = server.make_server(port=0)
+    host, port = httpd.server_address
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        for n in clients:
+            local = threading.local()
+
+            def query(pair):
+                if not hasattr(local, "connection"):
+                    local.connection = http.client.HTTPConnection(host, port)
+                params = urlencode({"source": pair[0], "target": pair[1]})
+                local.connection.request("GET", f"/path?{params}")
+                return json.loads(local.connection.getresponse().read())
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(n) as pool:
+                list(pool.map(query, named))
+            seconds = time.perf_counter() - start
+            print(
+                f"{label:>12} {f'server x{n}':>14}: "
+                f"{len(named) / seconds:10.1f} queries/sec"
+            )
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def measure(search, pairs):
+    """
+    Returns the `SearchStats` of running `search` over every pair, and
+    the path length found for each. Exits if a path is not made of
+    movies that each step's two people starred in.
+    """
+    graph = degrees.graph
+    stats = SearchStats()
+    lengths = []
+    for source, target in pairs:
+        path = search(source, target, stats=stats)
+        lengths.append(None if path is None else len(path))
+        person = source
+        for movie_id, person_id in path or []:
+            stars = graph.stars_for(graph.movie_index[movie_id])
+            if graph.person_index[person] not in stars or \
+                    graph.person_index[person_id] not in stars:
+                sys.exit("Search returned a broken path.")
+            person = person_id
+    return stats, lengths
+
+
+if __name__ == "__main__":
+    main()
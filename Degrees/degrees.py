@@ -1,65 +1,139 @@
+import argparse
 import csv
+import operator
+import os
 import sys
+import time
 
-from util import Node, StackFrontier, QueueFrontier
+import snapshot
+from graph import Graph, NamesView, PeopleView, MoviesView, SearchStats
+import landmarks
+from landmarks import LandmarkIndex
+
+# Integer-indexed actor/movie graph built by `load_data`
+graph = Graph([], [], [])
 
 # Maps names to a set of corresponding person_ids
-names = {}
+names = NamesView(graph)
 
 # Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
-people = {}
+people = PeopleView(graph)
 
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
-movies = {}
+movies = MoviesView(graph)
+
+# Landmark distances used to bound and prune searches, if loaded
+landmark_index = None
 
 
 def load_data(directory):
     """
-    Load data from CSV files into memory.
-    """
-    # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
-
-    # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
-
-    # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    Load data into memory, from the binary snapshot next to the CSV
+    files when it is up to date and from the CSV files otherwise.
+    """
+    stamp = snapshot.fingerprint(directory)
+    path = os.path.join(directory, snapshot.FILENAME)
+    graph = snapshot.read(path, stamp)
+    if graph is None:
+        graph = parse_data(directory)
+        try:
+            snapshot.write(graph, path, stamp)
+        except OSError:
+            # A read-only dataset still loads, just without the cache
+            pass
+    use_graph(graph)
+
+
+def parse_data(directory):
+    """
+    Parse the CSV files in `directory` into a graph in a single pass,
+    streaming rows straight into the graph's packed columns and arrays.
+    """
+    with open(f"{directory}/people.csv", encoding="utf-8") as people, \
+            open(f"{directory}/movies.csv", encoding="utf-8") as movies, \
+            open(f"{directory}/stars.csv", encoding="utf-8") as stars:
+        return Graph(
+            read_columns(people, ("id", "name", "birth")),
+            read_columns(movies, ("id", "title", "year")),
+            read_columns(stars, ("person_id", "movie_id"))
+        )
+
+
+def read_columns(f, columns):
+    """
+    Yields a tuple of the named `columns` for every row of CSV file `f`,
+    looking the columns up once in the header row. Raises ValueError if
+    a row is missing any of them.
+    """
+    reader = csv.reader(f)
+    header = next(reader, [])
+    select = operator.itemgetter(*(header.index(name) for name in columns))
+    for row in reader:
+        if row:
             try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+                values = select(row)
+            except IndexError:
+                raise ValueError(
+                    f"{f.name}, line {reader.line_num}: expected "
+                    f"{len(header)} columns, got {len(row)}"
+                ) from None
+            yield values
+
+
+def load_landmarks(directory, k=16, build=True):
+    """
+    Load the landmark index stored next to the CSV files, updating it
+    for rows appended to stars.csv. If there is no usable index, build
+    one from `k` landmarks when `build` is true. Returns the index.
+    """
+    global landmark_index
+    path = os.path.join(directory, landmarks.FILENAME)
+    index = LandmarkIndex.load(path, graph)
+    stamp = None if index is None else index.stamp
+    if index is None or not index.update(graph, directory):
+        if not build:
+            return None
+        index = LandmarkIndex.build(graph, k, directory)
+        stamp = None
+
+    # Only rewrite the file when building or updating changed the index
+    if index.stamp != stamp:
+        try:
+            index.save(path)
+        except OSError:
+            pass
+    landmark_index = index
+    return index
+
+
+def use_graph(new_graph):
+    """
+    Make `new_graph` the dataset answered by every other function.
+    """
+    global graph, names, people, movies, landmark_index
+    graph = new_graph
+    landmark_index = None
+    names = NamesView(graph)
+    people = PeopleView(graph)
+    movies = MoviesView(graph)
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two people."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="print counters and timings for the search"
+    )
+    args = parser.parse_args()
+    directory = args.directory
 
     # Load data from files into memory
     print("Loading data...")
     load_data(directory)
+    load_landmarks(directory, build=False)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -69,7 +143,14 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    bounds = distance_bounds(source, target)
+    if bounds is not None:
+        print(f"Estimate: between {bounds[0]} and {bounds[1]} degrees.")
+
+    stats = SearchStats() if args.stats else None
+    path = shortest_path(source, target, stats=stats)
+    if stats is not None:
+        print(f"Search: {stats}")
 
     if path is None:
         print("Not connected.")
@@ -84,49 +165,81 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, bidirectional=False, stats=None):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
-    If no possible path, returns None.
+    If no possible path, returns None. A `SearchStats` passed as `stats`
+    collects counters and timings for the search. A loaded landmark
+    index answers from its bounds or bounds the search, which is then
+    bidirectional whatever `bidirectional` says.
     """
+    if stats is not None:
+        began = time.perf_counter()
+
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+    if landmark_index is not None:
+        path = landmark_index.shortest_path(graph, source, target, stats)
+    elif bidirectional:
+        path = graph.bidirectional_shortest_path(source, target, stats)
+    else:
+        path = graph.shortest_path(source, target, stats)
 
-    # Initialize frontier to just the starting position
-    start = Node(state=source, parent=None, action=None)
-    frontier = QueueFrontier()
-    frontier.add(start)
-
-    explored = set()
-
-    while True:
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += time.perf_counter() - began
+    if path is None:
+        return None
+    return [
+        (graph.movie_ids[movie], graph.person_ids[person])
+        for movie, person in path
+    ]
 
-        if frontier.empty():
-            return None
 
-        node = frontier.remove()
+def bidirectional_shortest_path(source, target, stats=None):
+    """
+    Returns the same result as `shortest_path`, but searches outwards
+    from both the source and the target and stops as soon as they meet.
+    """
+    return shortest_path(source, target, bidirectional=True, stats=stats)
 
-        if node.state == target:
-            solution = []
-            while node.parent is not None:
-                solution.append((node.action, node.state))
-                node = node.parent
-            solution.reverse()
-            return solution
 
-        # Mark node as explored
-        explored.add(node.state)
+def distance_bounds(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    two person_ids from the landmark index, or None if none is loaded.
+    """
+    if landmark_index is None:
+        return None
+    return landmark_index.bounds(
+        graph.person_index[source], graph.person_index[target]
+    )
 
-        # Grab node neighbors
-        node_neighbors = neighbors_for_person(node.state)
 
-        if len(node_neighbors) == 0:
-            return None
-        else:
-            for action, state in node_neighbors:
-                if not frontier.contains_state(state) and state not in explored:
-                    child = Node(state=state, parent=node, action=action)
-                    frontier.add(child)
+def single_source(source):
+    """
+    Returns the distance from `source` to everyone reachable from it, and
+    for each of them the (movie_id, person_id) step back towards `source`,
+    from a single breadth-first search.
+    """
+    distances, parents, actions = graph.single_source(
+        graph.person_index[source]
+    )
+    reachable = {}
+    steps = {}
+    for person, distance in enumerate(distances):
+        if distance == -1:
+            continue
+        person_id = graph.person_ids[person]
+        reachable[person_id] = distance
+        if distance > 0:
+            steps[person_id] = (
+                graph.movie_ids[actions[person]],
+                graph.person_ids[parents[person]]
+            )
+    return reachable, steps
 
 
 def person_id_for_name(name):
@@ -155,16 +268,29 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def resolve_name(name, policy="exact"):
+    """
+    Returns the IMDB id for a person's name without prompting, along
+    with the ids of every candidate considered, best first. The id is
+    None when `policy` cannot settle on one person; see
+    `NameMatcher.resolve` for the policies.
+    """
+    person, candidates = graph.matcher.resolve(name, policy)
+    person_id = None if person is None else graph.person_ids[person]
+    return person_id, [graph.person_ids[c] for c in candidates]
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
+    person = graph.person_index[person_id]
     neighbors = set()
-    for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
+    for movie in graph.movies_for(person):
+        movie_id = graph.movie_ids[movie]
+        for star in graph.stars_for(movie):
+            neighbors.add((movie_id, graph.person_ids[star]))
     return neighbors
 
 
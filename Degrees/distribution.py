@@ -0,0 +1,98 @@
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import degrees
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute degree of separation distributions "
+                    "for a sample of people."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="distribution.json")
+    args = parser.parse_args()
+
+    # Loading once here also leaves a fresh snapshot for the workers to map
+    print("Loading data...")
+    degrees.load_data(args.directory)
+    print("Data loaded.")
+
+    sources = sample_sources(args.samples, args.seed)
+    start = time.perf_counter()
+    results = distribution(args.directory, sources, args.workers)
+    seconds = time.perf_counter() - start
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(
+        f"Wrote {args.output}: {len(sources)} sources "
+        f"in {seconds:.2f}s"
+    )
+
+
+def sample_sources(n, seed=0):
+    """
+    Returns up to `n` random person_ids with at least one movie.
+    """
+    graph = degrees.graph
+    candidates = [
+        person for person in range(len(graph.person_ids))
+        if len(graph.movies_for(person)) > 0
+    ]
+    chosen = random.Random(seed).sample(
+        candidates, min(n, len(candidates))
+    )
+    return [graph.person_ids[person] for person in sorted(chosen)]
+
+
+def distribution(directory, sources, workers=None):
+    """
+    Runs a single-source search from each of `sources` on a pool of
+    `workers` processes. Returns a dictionary with each source's
+    eccentricity and distance histogram, plus their totals.
+    """
+    with Pool(workers, initializer=degrees.load_data,
+              initargs=(directory,)) as pool:
+        per_source = pool.map(summarize, sources)
+
+    eccentricities = Counter()
+    histogram = Counter()
+    for result in per_source:
+        eccentricities[result["eccentricity"]] += 1
+        for distance, count in result["histogram"].items():
+            histogram[distance] += count
+
+    return {
+        "sources": per_source,
+        "eccentricity_histogram": dict(sorted(eccentricities.items())),
+        "distance_histogram": dict(sorted(histogram.items())),
+    }
+
+
+def summarize(source):
+    """
+    Returns the eccentricity of `source` within its connected component
+    and how many people sit at each distance from it.
+    """
+    graph = degrees.graph
+    distances, _, _ = graph.single_source(graph.person_index[source])
+    histogram = Counter(distance for distance in distances if distance > 0)
+    return {
+        "person_id": source,
+        "name": graph.person_names[graph.person_index[source]],
+        "reachable": sum(histogram.values()),
+        "eccentricity": max(histogram, default=0),
+        "histogram": dict(sorted(histogram.items())),
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import heapq
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Similarity a fuzzy match needs before the "best" policy accepts it
+MIN_SCORE = 0.4
+
+# Upper bound on the postings scanned for one query, after the first
+MAX_POSTINGS = 5000
+
+# Policies for resolving a name without asking the user
+POLICIES = ("exact", "best")
+
+
+def normalize(name):
+    """
+    Returns `name` lowercased, stripped of accents and punctuation, and
+    with runs of whitespace collapsed.
+    """
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^\w\s]", "", name.lower())
+    return " ".join(name.split())
+
+
+def trigrams(name):
+    """
+    Returns the set of three-character substrings of normalized `name`,
+    padded so that the start and end of each word count as well.
+    """
+    padded = f"  {normalize(name)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_index(names, typecode="I"):
+    """
+    Returns an inverted index over `names` as CSR arrays (grams, offsets,
+    people, counts): the positions of names containing the trigram
+    `grams[g]` are `people[offsets[g]:offsets[g + 1]]`, `grams` is
+    sorted, and `counts[p]` is the number of trigrams in name `p`.
+    """
+    postings = {}
+    counts = array(typecode)
+    for person, name in enumerate(names):
+        grams = trigrams(name)
+        counts.append(len(grams))
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array(typecode)
+            posting.append(person)
+
+    grams = sorted(postings)
+    offsets = array(typecode, [0])
+    people = array(typecode)
+    for gram in grams:
+        people.extend(postings[gram])
+        offsets.append(len(people))
+    return grams, offsets, people, counts
+
+
+class NameMatcher():
+    """
+    Ranks the people of a graph by how closely their names match a
+    query, using the trigram index stored in the graph.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def postings(self, gram):
+        """
+        Returns the people whose names contain trigram `gram`.
+        """
+        graph = self.graph
+        i = bisect_left(graph.name_grams, gram)
+        if i == len(graph.name_grams) or graph.name_grams[i] != gram:
+            return graph.gram_people[0:0]
+        return graph.gram_people[
+            graph.gram_offsets[i]:graph.gram_offsets[i + 1]
+        ]
+
+    def candidates(self, name, limit=10):
+        """
+        Returns up to `limit` (score, person) pairs for people whose names
+        resemble `name`, best first. Scores are the Jaccard similarity of
+        trigram sets, so an exact match scores 1, although trigrams too
+        common to scan in `MAX_POSTINGS` are left out. Equal scores are
+        ordered by birth year, with unknown years last.
+        """
+        graph = self.graph
+        name, year = split_year(name)
+        query = trigrams(name)
+        if not query:
+            return []
+
+        # Count shared trigrams from the rarest postings up, skipping the
+        # most common ones once enough have been read
+        postings = sorted(
+            (self.postings(gram) for gram in query), key=len
+        )
+        hits = Counter()
+        scanned = 0
+        for posting in postings:
+            if scanned and scanned + len(posting) > MAX_POSTINGS:
+                break
+            hits.update(posting)
+            scanned += len(posting)
+
+        # A name sharing under a quarter of the query scores below 0.25,
+        # so leave those out before doing any arithmetic
+        counts = graph.gram_counts
+        size = len(query)
+        floor = max(1, size // 4)
+        ranked = [
+            (shared / (size + counts[person] - shared), person)
+            for person, shared in hits.items() if shared >= floor
+        ]
+        if year is not None:
+            ranked = [
+                pair for pair in ranked
+                if graph.person_births[pair[1]] == year
+            ]
+        if len(ranked) > limit:
+            # Only people tied with the cut-off need their birth years
+            cutoff = heapq.nlargest(limit, ranked)[-1][0]
+            ranked = [pair for pair in ranked if pair[0] >= cutoff]
+        ranked.sort(key=lambda pair: (
+            -pair[0], birth_key(graph.person_births[pair[1]]), pair[1]
+        ))
+        return ranked[:limit]
+
+    def resolve(self, name, policy="exact"):
+        """
+        Returns (person, candidates) for `name` without prompting.
+        `person` is None when the name cannot be settled, in which case
+        `candidates` lists the people it might mean, if any.
+
+        With the "exact" policy only case-insensitive exact matches count.
+        With "best" a name with no exact match goes to the top ranked
+        match, and matches scoring below `MIN_SCORE` are dropped. Either
+        way several exact matches are ambiguous, and a trailing "(YEAR)"
+        restricts matches to that birth year.
+        """
+        graph = self.graph
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy: {policy}")
+
+        bare, year = split_year(name)
+        exact = [
+            person for person in graph.name_index.positions(bare)
+            if year is None or graph.person_births[person] == year
+        ]
+        if len(exact) == 1:
+            return exact[0], exact
+        if len(exact) > 1 or policy == "exact":
+            return None, sorted(
+                exact, key=lambda person: (
+                    birth_key(graph.person_births[person]), person
+                )
+            )
+
+        ranked = [
+            person for score, person in self.candidates(name)
+            if score >= MIN_SCORE
+        ]
+        if ranked:
+            return ranked[0], ranked
+        return None, ranked
+
+
+def split_year(name):
+    """
+    Splits a trailing "(YEAR)" off `name`, returning (name, year) with
+    year None when there is none.
+    """
+    match = re.fullmatch(r"\s*(.*?)\s*\((\d{4})\)\s*", name)
+    if match is None:
+        return name.strip(), None
+    return match.group(1), match.group(2)
+
+
+def birth_key(birth):
+    """
+    Sort key placing known birth years in order before unknown ones.
+    """
+    return (0, birth) if birth else (1, "")
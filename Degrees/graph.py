@@ -0,0 +1,594 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from time import perf_counter
+
+from fuzzy import NameMatcher, trigram_index
+
+# Array typecode used for interned ids and CSR offsets
+INDEX = "I"
+
+
+class SearchStats():
+    """
+    Counters filled in by a search when passed as its `stats` argument,
+    accumulated over every query that shares the object. Searches only
+    touch it when one is given, so leaving it out costs nothing.
+    """
+    def __init__(self):
+        # Searches run
+        self.queries = 0
+        # People whose neighbors were generated
+        self.expanded = 0
+        # People reached, including those never expanded
+        self.reached = 0
+        # Largest frontier held at once
+        self.frontier_peak = 0
+        # Seconds spent generating neighbors, and in whole searches
+        self.neighbor_seconds = 0.0
+        self.seconds = 0.0
+
+    def frontier(self, size):
+        """
+        Records a frontier of `size` people.
+        """
+        if size > self.frontier_peak:
+            self.frontier_peak = size
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        return (
+            f"{self.queries} queries: {self.expanded} expanded, "
+            f"{self.reached} reached, frontier peak {self.frontier_peak}, "
+            f"{1000 * self.neighbor_seconds:.3f} ms generating neighbors, "
+            f"{1000 * self.seconds:.3f} ms total"
+        )
+
+
+class Graph():
+    """
+    Actor/movie graph with people and movies interned to dense integer
+    ids and their memberships stored as compressed sparse rows: the
+    movies of person `p` are `person_movies[person_offsets[p]:
+    person_offsets[p + 1]]`, and likewise for the stars of a movie.
+    """
+    # Attributes that fully describe a graph, in snapshot order
+    PARTS = (
+        "person_ids", "person_names", "person_births",
+        "movie_ids", "movie_titles", "movie_years",
+        "person_offsets", "person_movies", "movie_offsets", "movie_stars",
+        "person_order", "movie_order", "name_order",
+        "name_grams", "gram_offsets", "gram_people", "gram_counts",
+    )
+
+    def __init__(self, people, movies, stars):
+        """
+        Build the graph from `people` (id, name, birth) rows, `movies`
+        (id, title, year) rows and `stars` (person_id, movie_id) pairs.
+        Pairs naming an unknown person or movie are ignored.
+        """
+        # Text columns are packed as UTF-8 rather than kept as one Python
+        # string per cell; the id dictionaries only live for the build
+        self.person_ids = StringTable()
+        self.person_names = StringTable()
+        self.person_births = StringTable()
+        person_index = {}
+        for person_id, name, birth in people:
+            person_index[person_id] = len(self.person_ids)
+            self.person_ids.append(person_id)
+            self.person_names.append(name)
+            self.person_births.append(birth)
+
+        self.movie_ids = StringTable()
+        self.movie_titles = StringTable()
+        self.movie_years = StringTable()
+        movie_index = {}
+        for movie_id, title, year in movies:
+            movie_index[movie_id] = len(self.movie_ids)
+            self.movie_ids.append(movie_id)
+            self.movie_titles.append(title)
+            self.movie_years.append(year)
+
+        edge_people = array(INDEX)
+        edge_movies = array(INDEX)
+        for person_id, movie_id in stars:
+            person = person_index.get(person_id)
+            movie = movie_index.get(movie_id)
+            if person is None or movie is None:
+                continue
+            edge_people.append(person)
+            edge_movies.append(movie)
+        del person_index, movie_index
+
+        self.person_offsets, self.person_movies = compress(
+            len(self.person_ids), edge_people, edge_movies
+        )
+        self.movie_offsets, self.movie_stars = compress(
+            len(self.movie_ids), edge_movies, edge_people
+        )
+        del edge_people, edge_movies
+
+        # Sorting permutations let ids and names be found by binary search
+        self.person_order = sort_order(self.person_ids)
+        self.movie_order = sort_order(self.movie_ids)
+        self.name_order = sort_order(self.person_names, str.lower)
+        (self.name_grams, self.gram_offsets, self.gram_people,
+         self.gram_counts) = trigram_index(self.person_names, INDEX)
+        self.index()
+
+    @classmethod
+    def from_parts(cls, parts):
+        """
+        Returns a graph from a dictionary holding every attribute named
+        in `PARTS`, such as one read back from a snapshot.
+        """
+        graph = cls.__new__(cls)
+        for name in cls.PARTS:
+            setattr(graph, name, parts[name])
+        graph.index()
+        return graph
+
+    def index(self):
+        """
+        Set up the id and name lookups over the sorting permutations.
+        """
+        self.person_index = SortedIndex(self.person_ids, self.person_order)
+        self.movie_index = SortedIndex(self.movie_ids, self.movie_order)
+        self.name_index = SortedIndex(
+            self.person_names, self.name_order, str.lower
+        )
+        self.matcher = NameMatcher(self)
+
+    def movies_for(self, person):
+        """
+        Returns the movies `person` starred in.
+        """
+        return self.person_movies[
+            self.person_offsets[person]:self.person_offsets[person + 1]
+        ]
+
+    def stars_for(self, movie):
+        """
+        Returns the people who starred in `movie`.
+        """
+        return self.movie_stars[
+            self.movie_offsets[movie]:self.movie_offsets[movie + 1]
+        ]
+
+    def shortest_path(self, source, target, stats=None):
+        """
+        Returns the shortest list of (movie, person) pairs connecting
+        person `source` to person `target`, or None if not connected.
+        """
+        if source == target:
+            return []
+
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+
+        # Maps each reached person to the person and movie it came from
+        parents = {source: None}
+        actions = {}
+        # A movie links all of its stars at once, so expand it only once
+        seen_movies = set()
+        frontier = [source]
+        next_frontier = []
+
+        try:
+            while frontier:
+                if stats is not None:
+                    stats.frontier(len(frontier))
+                next_frontier = []
+                for person in frontier:
+                    if stats is not None:
+                        stats.expanded += 1
+                        began = perf_counter()
+                    for i in range(person_offsets[person],
+                                   person_offsets[person + 1]):
+                        movie = person_movies[i]
+                        if movie in seen_movies:
+                            continue
+                        seen_movies.add(movie)
+                        for j in range(movie_offsets[movie],
+                                       movie_offsets[movie + 1]):
+                            star = movie_stars[j]
+                            if star in parents:
+                                continue
+                            parents[star] = person
+                            actions[star] = movie
+                            if star == target:
+                                return trace(target, parents, actions)
+                            next_frontier.append(star)
+                    if stats is not None:
+                        stats.neighbor_seconds += perf_counter() - began
+                frontier = next_frontier
+
+            return None
+        finally:
+            if stats is not None:
+                stats.frontier(len(next_frontier))
+                stats.reached += len(parents)
+
+    def single_source(self, source):
+        """
+        Runs one breadth-first search from `source` and returns arrays
+        (distances, parents, actions) indexed by person: the number of
+        steps from `source`, the person one step closer, and the movie
+        linking them. Unreachable people have distance and parent -1.
+        """
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+
+        n = len(self.person_ids)
+        distances = array("i", [-1]) * n
+        parents = array("i", [-1]) * n
+        actions = array("i", [-1]) * n
+        seen_movies = bytearray(len(self.movie_ids))
+
+        distances[source] = 0
+        frontier = [source]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for person in frontier:
+                for i in range(person_offsets[person],
+                               person_offsets[person + 1]):
+                    movie = person_movies[i]
+                    if seen_movies[movie]:
+                        continue
+                    seen_movies[movie] = 1
+                    for j in range(movie_offsets[movie],
+                                   movie_offsets[movie + 1]):
+                        star = movie_stars[j]
+                        if distances[star] != -1:
+                            continue
+                        distances[star] = depth
+                        parents[star] = person
+                        actions[star] = movie
+                        next_frontier.append(star)
+            frontier = next_frontier
+
+        return distances, parents, actions
+
+    def bidirectional_shortest_path(self, source, target, stats=None,
+                                    limit=None):
+        """
+        Returns the same result as `shortest_path`, but searches outwards
+        from both ends one level at a time, always growing the smaller
+        frontier, and stops as soon as the two searches meet. With a
+        `limit`, only paths of fewer steps are looked for, and None is
+        returned once the two depths show none can exist.
+        """
+        if source == target:
+            return []
+
+        forward = Search(source)
+        backward = Search(target)
+
+        try:
+            while forward.frontier and backward.frontier:
+                if limit is not None and \
+                        forward.depth + backward.depth + 1 >= limit:
+                    return None
+                if stats is not None:
+                    stats.frontier(
+                        len(forward.frontier) + len(backward.frontier)
+                    )
+                if len(forward.frontier) <= len(backward.frontier):
+                    meeting = self.expand_level(forward, backward, stats)
+                else:
+                    meeting = self.expand_level(backward, forward, stats)
+
+                if meeting is not None:
+                    path = trace(meeting, forward.parents, forward.actions)
+
+                    # Backward parents point towards the target
+                    person = meeting
+                    while person != target:
+                        path.append((
+                            backward.actions[person],
+                            backward.parents[person]
+                        ))
+                        person = backward.parents[person]
+                    return path
+
+            return None
+        finally:
+            if stats is not None:
+                stats.frontier(
+                    len(forward.frontier) + len(backward.frontier)
+                )
+                stats.reached += (
+                    len(forward.parents) + len(backward.parents)
+                )
+
+    def expand_level(self, search, other, stats=None):
+        """
+        Expands every person in the frontier of `search` by one step.
+        Returns the person, if any, where it met `other` along the
+        shortest combined path.
+        """
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        parents = search.parents
+        actions = search.actions
+        seen_movies = search.seen_movies
+
+        next_frontier = []
+        meeting = None
+        best = None
+        for person in search.frontier:
+            if stats is not None:
+                stats.expanded += 1
+                began = perf_counter()
+            for i in range(person_offsets[person],
+                           person_offsets[person + 1]):
+                movie = person_movies[i]
+                if movie in seen_movies:
+                    continue
+                seen_movies.add(movie)
+                for j in range(movie_offsets[movie],
+                               movie_offsets[movie + 1]):
+                    star = movie_stars[j]
+                    if star in parents:
+                        continue
+                    parents[star] = person
+                    actions[star] = movie
+                    next_frontier.append(star)
+                    if star in other.depths:
+                        # People reached by `other` may sit at different
+                        # depths, so keep the shortest combined path
+                        length = other.depths[star]
+                        if best is None or length < best:
+                            meeting, best = star, length
+            if stats is not None:
+                stats.neighbor_seconds += perf_counter() - began
+
+        search.depth += 1
+        for person in next_frontier:
+            search.depths[person] = search.depth
+        search.frontier = next_frontier
+        return meeting
+
+
+class StringTable():
+    """
+    Sequence of strings decoded on access from a UTF-8 `blob`, where
+    string `i` spans `blob[offsets[i]:offsets[i + 1]]`. Without
+    arguments it starts empty and grows with `append`.
+    """
+    def __init__(self, offsets=None, blob=None):
+        self.offsets = array("Q", [0]) if offsets is None else offsets
+        self.blob = bytearray() if blob is None else blob
+
+    def append(self, string):
+        self.blob += string.encode("utf-8")
+        self.offsets.append(len(self.blob))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class Search():
+    """
+    State of one side of a bidirectional search.
+    """
+    def __init__(self, root):
+        self.parents = {root: None}
+        self.actions = {}
+        self.depths = {root: 0}
+        self.seen_movies = set()
+        self.frontier = [root]
+        self.depth = 0
+
+
+class SortedIndex(Mapping):
+    """
+    Maps keys to their positions in `keys` by binary search over the
+    sorting permutation `order`, so no hash table has to be built.
+    Keys are compared after applying `normalize`, if given.
+    """
+    def __init__(self, keys, order, normalize=None):
+        self.keys = keys
+        self.order = order
+        self.normalize = normalize
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        for i in self.order:
+            yield self.keys[i]
+
+    def __getitem__(self, key):
+        positions = self.positions(key)
+        if not positions:
+            raise KeyError(key)
+        return positions[0]
+
+    def positions(self, key):
+        """
+        Returns the positions of every key equal to `key`.
+        """
+        if self.normalize is not None:
+            key = self.normalize(key)
+        sorted_keys = SortedKeys(self)
+        low = bisect_left(sorted_keys, key)
+        high = bisect_right(sorted_keys, key, low)
+        return list(self.order[low:high])
+
+
+class SortedKeys():
+    """
+    Sequence of an index's normalized keys in sorted order.
+    """
+    def __init__(self, index):
+        self.keys = index.keys
+        self.order = index.order
+        self.normalize = index.normalize
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        key = self.keys[self.order[i]]
+        if self.normalize is not None:
+            key = self.normalize(key)
+        return key
+
+
+class NamesView(Mapping):
+    """
+    Read-only view of a graph's people as lowercase names mapped to
+    sets of IMDB ids.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, name):
+        graph = self.graph
+        positions = graph.name_index.positions(name)
+        if not positions:
+            raise KeyError(name)
+        return {graph.person_ids[person] for person in positions}
+
+    def __iter__(self):
+        previous = None
+        for name in SortedKeys(self.graph.name_index):
+            if name != previous:
+                yield name
+                previous = name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class PeopleView(Mapping):
+    """
+    Read-only view of a graph's people in the original dictionary form
+    of `{"name", "birth", "movies"}` keyed by IMDB id.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        graph = self.graph
+        person = graph.person_index[person_id]
+        return {
+            "name": graph.person_names[person],
+            "birth": graph.person_births[person],
+            "movies": {
+                graph.movie_ids[movie] for movie in graph.movies_for(person)
+            }
+        }
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return len(self.graph.person_ids)
+
+
+class MoviesView(Mapping):
+    """
+    Read-only view of a graph's movies in the original dictionary form
+    of `{"title", "year", "stars"}` keyed by IMDB id.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        graph = self.graph
+        movie = graph.movie_index[movie_id]
+        return {
+            "title": graph.movie_titles[movie],
+            "year": graph.movie_years[movie],
+            "stars": {
+                graph.person_ids[person] for person in graph.stars_for(movie)
+            }
+        }
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return len(self.graph.movie_ids)
+
+
+def compress(n, rows, columns):
+    """
+    Returns CSR (offsets, targets) arrays for `n` rows from parallel
+    `rows` and `columns` arrays, with each row sorted and deduplicated.
+    """
+    counts = array(INDEX, [0]) * n
+    for row in rows:
+        counts[row] += 1
+
+    offsets = array(INDEX, [0]) * (n + 1)
+    total = 0
+    for row in range(n):
+        offsets[row] = total
+        total += counts[row]
+    offsets[n] = total
+
+    # Scatter each column into its row, then sort and drop duplicates
+    targets = array(INDEX, [0]) * total
+    cursor = array(INDEX, offsets)
+    for row, column in zip(rows, columns):
+        targets[cursor[row]] = column
+        cursor[row] += 1
+
+    compact = array(INDEX, [0]) * (n + 1)
+    size = 0
+    for row in range(n):
+        values = sorted(set(targets[offsets[row]:offsets[row + 1]]))
+        targets[size:size + len(values)] = array(INDEX, values)
+        size += len(values)
+        compact[row + 1] = size
+    del targets[size:]
+    return compact, targets
+
+
+def sort_order(keys, normalize=None):
+    """
+    Returns the permutation that sorts `keys`, as an array.
+    """
+    if normalize is None:
+        key = keys.__getitem__
+    else:
+        def key(i):
+            return normalize(keys[i])
+    return array(INDEX, sorted(range(len(keys)), key=key))
+
+
+def trace(person, parents, actions):
+    """
+    Returns the (movie, person) pairs leading from the root of a search
+    to `person`.
+    """
+    path = []
+    while parents[person] is not None:
+        path.append((actions[person], person))
+        person = parents[person]
+    path.reverse()
+    return path
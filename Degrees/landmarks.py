@@ -0,0 +1,302 @@
+import csv
+import math
+import os
+import struct
+import zlib
+from array import array
+from collections import deque
+
+from snapshot import fingerprint
+
+# Bump whenever the layout below changes so stale indexes are rebuilt
+VERSION = 2
+
+MAGIC = b"LANDMARK"
+
+# Magic, version, landmarks, people, (mtime_ns, size) of each CSV file
+# indexed, then the CRC-32 of the indexed bytes of stars.csv
+HEADER = struct.Struct("<8sIII6qI")
+
+# Bytes of stars.csv read at a time when checking its contents
+CHUNK = 1 << 20
+
+FILENAME = "degrees.landmarks"
+
+
+class LandmarkIndex():
+    """
+    Distances from a few landmark people to everyone else, used to bound
+    the degrees of separation between any pair by the triangle
+    inequality: |d(l, s) - d(l, t)| <= d(s, t) <= d(l, s) + d(l, t).
+    """
+    def __init__(self, landmarks, distances, parents, actions, stamp,
+                 checksum):
+        self.landmarks = landmarks
+        # Per landmark arrays indexed by person, as from Graph.single_source
+        self.distances = distances
+        self.parents = parents
+        self.actions = actions
+        # The CSV files the index reflects, as from snapshot.fingerprint,
+        # and the checksum of the part of stars.csv it has read
+        self.stamp = stamp
+        self.checksum = checksum
+
+    @classmethod
+    def build(cls, graph, k, directory=None):
+        """
+        Returns an index over the `k` people with the most movies, which
+        sit near the middle of the graph and so give the tightest bounds.
+        """
+        people = sorted(
+            range(len(graph.person_ids)),
+            key=lambda person: len(graph.movies_for(person)),
+            reverse=True
+        )[:k]
+        distances, parents, actions = [], [], []
+        for landmark in people:
+            d, p, a = graph.single_source(landmark)
+            distances.append(d)
+            parents.append(p)
+            actions.append(a)
+        if directory is None:
+            stamp, checksum = (0,) * 6, 0
+        else:
+            stamp = fingerprint(directory)
+            checksum = stars_checksum(directory, stamp[5])
+        return cls(
+            array("i", people), distances, parents, actions, stamp, checksum
+        )
+
+    def bounds(self, source, target):
+        """
+        Returns (lower, upper) bounds on the degrees of separation between
+        people `source` and `target`. Both are infinite if some landmark
+        reaches one but not the other, since they are then disconnected.
+        """
+        if source == target:
+            return 0, 0
+        lower = 0
+        upper = math.inf
+        for distances in self.distances:
+            s = distances[source]
+            t = distances[target]
+            if s == -1 or t == -1:
+                if s != t:
+                    return math.inf, math.inf
+                continue
+            if s + t < upper:
+                upper = s + t
+            if abs(s - t) > lower:
+                lower = abs(s - t)
+        return lower, upper
+
+    def landmark_path(self, source, target):
+        """
+        Returns the (movie, person) pairs of the shortest walk from
+        `source` to `target` through a single landmark, or None if no
+        landmark reaches both.
+        """
+        best = None
+        for i, distances in enumerate(self.distances):
+            s = distances[source]
+            t = distances[target]
+            if s != -1 and t != -1 and (best is None or s + t < best[0]):
+                best = (s + t, i)
+        if best is None:
+            return None
+        parents = self.parents[best[1]]
+        actions = self.actions[best[1]]
+
+        # Parents point towards the landmark, so walk up from the source
+        path = []
+        person = source
+        while parents[person] != -1:
+            path.append((actions[person], parents[person]))
+            person = parents[person]
+
+        # ...then walk up from the target and replay it in reverse
+        tail = []
+        person = target
+        while parents[person] != -1:
+            tail.append((actions[person], person))
+            person = parents[person]
+        path.extend(reversed(tail))
+        return path
+
+    def shortest_path(self, graph, source, target, stats=None):
+        """
+        Returns the same result as `Graph.shortest_path`. Pairs whose
+        bounds meet, or show they are disconnected, are answered without
+        searching; otherwise a bidirectional search looks only for paths
+        shorter than the landmark path, which is the answer if it finds
+        none.
+        """
+        if source == target:
+            return []
+        lower, upper = self.bounds(source, target)
+        if lower == math.inf:
+            return None
+        if lower == upper:
+            return self.landmark_path(source, target)
+        if upper == math.inf:
+            return graph.bidirectional_shortest_path(source, target, stats)
+
+        path = graph.bidirectional_shortest_path(
+            source, target, stats, limit=upper
+        )
+        if path is None:
+            return self.landmark_path(source, target)
+        return path
+
+    def update(self, graph, directory):
+        """
+        Brings the index up to date with rows appended to stars.csv since
+        it was built. Returns False if the index must be rebuilt instead,
+        because people.csv or movies.csv changed, or stars.csv changed
+        other than by rows appended to its end.
+        """
+        stamp = fingerprint(directory)
+        if stamp == self.stamp:
+            return True
+        size, indexed = stamp[5], self.stamp[5]
+        if (stamp[:4] != self.stamp[:4] or size < indexed or
+                len(self.distances) == 0 or
+                len(self.distances[0]) != len(graph.person_ids) or
+                stars_checksum(directory, indexed) != self.checksum):
+            return False
+
+        movies = set()
+        for person_id, movie_id in read_stars(directory, indexed):
+            movie = graph.movie_index.get(movie_id)
+            if movie is not None and person_id in graph.person_index:
+                movies.add(movie)
+
+        for i in range(len(self.landmarks)):
+            self.relax(graph, i, movies)
+        self.stamp = stamp
+        self.checksum = stars_checksum(directory, size)
+        return True
+
+    def relax(self, graph, i, movies):
+        """
+        Lowers the distances from landmark `i` after new stars joined
+        each of `movies`. Adding edges can only shorten paths, so this
+        propagates decreases outwards from the changed movies.
+        """
+        distances = self.distances[i]
+        parents = self.parents[i]
+        actions = self.actions[i]
+
+        queue = deque()
+        for movie in movies:
+            stars = graph.stars_for(movie)
+            reached = [star for star in stars if distances[star] != -1]
+            if not reached:
+                continue
+            nearest = min(reached, key=distances.__getitem__)
+            for star in stars:
+                if distances[star] == -1 or \
+                        distances[star] > distances[nearest] + 1:
+                    distances[star] = distances[nearest] + 1
+                    parents[star] = nearest
+                    actions[star] = movie
+                    queue.append(star)
+
+        while queue:
+            person = queue.popleft()
+            for movie in graph.movies_for(person):
+                for star in graph.stars_for(movie):
+                    if distances[star] == -1 or \
+                            distances[star] > distances[person] + 1:
+                        distances[star] = distances[person] + 1
+                        parents[star] = person
+                        actions[star] = movie
+                        queue.append(star)
+
+    def save(self, path):
+        """
+        Writes the index to `path`, replacing any previous file atomically.
+        """
+        people = len(self.distances[0]) if self.distances else 0
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(HEADER.pack(
+                    MAGIC, VERSION, len(self.landmarks), people,
+                    *self.stamp, self.checksum
+                ))
+                array("i", self.landmarks).tofile(f)
+                for arrays in (self.distances, self.parents, self.actions):
+                    for values in arrays:
+                        array("i", values).tofile(f)
+            os.replace(temporary, path)
+        except BaseException:
+            # Leave no half-written file behind
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path, graph):
+        """
+        Returns the index stored at `path`, or None if it is missing,
+        from another version, or covers more people than `graph` has.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+                magic, version, k, people, *stamp, checksum = \
+                    HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION or \
+                        people > len(graph.person_ids):
+                    return None
+                landmarks = read_array(f, k)
+                tables = [
+                    [read_array(f, people) for _ in range(k)]
+                    for _ in range(3)
+                ]
+        except (OSError, EOFError, struct.error):
+            return None
+        return cls(landmarks, *tables, tuple(stamp), checksum)
+
+
+def read_array(f, n):
+    """
+    Reads `n` signed integers from file `f`.
+    """
+    values = array("i")
+    values.fromfile(f, n)
+    return values
+
+
+def stars_checksum(directory, size):
+    """
+    Returns the CRC-32 of the first `size` bytes of stars.csv in
+    `directory`, or -1 if it is shorter than that.
+    """
+    checksum = 0
+    with open(os.path.join(directory, "stars.csv"), "rb") as f:
+        while size > 0:
+            chunk = f.read(min(size, CHUNK))
+            if not chunk:
+                return -1
+            checksum = zlib.crc32(chunk, checksum)
+            size -= len(chunk)
+    return checksum
+
+
+def read_stars(directory, offset):
+    """
+    Yields (person_id, movie_id) pairs from the rows of stars.csv that
+    start at or after byte `offset`.
+    """
+    with open(os.path.join(directory, "stars.csv"), "rb") as f:
+        header = f.readline().decode("utf-8")
+        columns = next(csv.reader([header]))
+        person_column = columns.index("person_id")
+        movie_column = columns.index("movie_id")
+        f.seek(max(offset, f.tell()))
+        lines = (line.decode("utf-8") for line in f)
+        for row in csv.reader(lines):
+            if len(row) == len(columns):
+                yield row[person_column], row[movie_column]
@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import degrees
+from batch import answer
+from fuzzy import POLICIES
+
+# Least number of pending connections the listening socket queues, and
+# how many more to queue per pool thread
+BACKLOG = 128
+BACKLOG_PER_THREAD = 16
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer degrees of separation queries over HTTP."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--socket", help="listen on a Unix socket instead")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument(
+        "--landmarks", type=int, default=0, metavar="K",
+        help="prune searches with an index of K landmark people"
+    )
+    args = parser.parse_args()
+
+    print("Loading data...")
+    degrees.load_data(args.directory)
+    if args.landmarks:
+        degrees.load_landmarks(args.directory, args.landmarks)
+    print("Data loaded.")
+
+    server = make_server(args.host, args.port, args.socket, args.threads)
+    where = args.socket or "http://{}:{}".format(*server.server_address)
+    print(f"Serving on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.unlink(args.socket)
+
+
+class PoolMixIn(socketserver.ThreadingMixIn):
+    """
+    Handles each request on the thread pool `pool` rather than on a new
+    thread per request.
+    """
+    pool = None
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+
+class PoolHTTPServer(PoolMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PoolUnixHTTPServer(PoolMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers `GET /path?source=NAME&target=NAME[&names=POLICY][&stats=1]`
+    with the JSON object `batch.answer` returns for the pair.
+    """
+    # Keep connections alive between queries, but give a pool thread back
+    # once its client has been idle this many seconds
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+
+    # Buffer each response so its headers and body go out in one write,
+    # rather than waiting on a delayed acknowledgement in between
+    wbufsize = -1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path != "/path" or "source" not in query or \
+                "target" not in query:
+            self.reply(404, {
+                "error": "Use /path?source=NAME&target=NAME"
+            })
+            return
+        policy = query.get("names", ["exact"])[0]
+        if policy not in POLICIES:
+            self.reply(400, {"error": f"Unknown names policy: {policy}"})
+            return
+        stats = query.get("stats", ["0"])[0] not in ("", "0", "false")
+        self.reply(200, answer(
+            query["source"][0], query["target"][0], policy, stats
+        ))
+
+    def reply(self, status, result):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else "-"
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8000, socket=None, threads=8):
+    """
+    Returns an HTTP server answering queries against the loaded data,
+    listening on `socket` if given and on `host`:`port` otherwise.
+    """
+    if socket is not None:
+        if sys.platform == "win32":
+            sys.exit("Unix sockets are not supported on this platform.")
+        server = PoolUnixHTTPServer(socket, QueryHandler, False)
+    else:
+        server = PoolHTTPServer((host, port), QueryHandler, False)
+
+    # The default backlog of 5 drops connections from busy clients long
+    # before the pool is saturated, so queue a few per thread
+    server.request_queue_size = max(BACKLOG, BACKLOG_PER_THREAD * threads)
+    server.pool = ThreadPoolExecutor(threads)
+    try:
+        server.server_bind()
+        server.server_activate()
+    except BaseException:
+        server.server_close()
+        raise
+    return server
+
+
+if __name__ == "__main__":
+    main()
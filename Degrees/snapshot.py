@@ -0,0 +1,159 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from graph import Graph, StringTable, INDEX
+
+# Bump whenever the layout below changes so stale snapshots are rebuilt
+VERSION = 2
+
+MAGIC = b"DEGREES\0"
+
+# Magic, version, byte order, then (mtime_ns, size) for each CSV file
+HEADER = struct.Struct("<8sIc6q")
+
+# Offset and length in bytes of one stored array
+SECTION = struct.Struct("<QQ")
+
+SOURCES = ("people.csv", "movies.csv", "stars.csv")
+
+FILENAME = "degrees.snapshot"
+
+# Graph parts stored as string tables rather than integer arrays
+STRINGS = {
+    "person_ids", "person_names", "person_births",
+    "movie_ids", "movie_titles", "movie_years", "name_grams",
+}
+
+
+def fingerprint(directory):
+    """
+    Returns the (mtime_ns, size) of each source CSV in `directory`.
+    """
+    values = []
+    for name in SOURCES:
+        info = os.stat(os.path.join(directory, name))
+        values.extend([info.st_mtime_ns, info.st_size])
+    return tuple(values)
+
+
+def read(path, expected):
+    """
+    Memory-maps the snapshot at `path` and returns its graph, or None if
+    it is missing, from another version, or was built from source files
+    that no longer match the fingerprint `expected`.
+    """
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, version, byteorder, *stamp = HEADER.unpack_from(buffer)
+    except struct.error:
+        return None
+    if (magic != MAGIC or version != VERSION or
+            byteorder != sys.byteorder[0].encode() or
+            tuple(stamp) != tuple(expected)):
+        return None
+
+    # A truncated or corrupt file is rebuilt rather than trusted
+    view = memoryview(buffer)
+    position = HEADER.size
+    parts = {}
+    try:
+        for name in Graph.PARTS:
+            if name in STRINGS:
+                offsets = section(view, position, "Q")
+                blob = section(view, position + SECTION.size, "B")
+                parts[name] = StringTable(offsets, blob)
+                position += 2 * SECTION.size
+            else:
+                parts[name] = section(view, position, INDEX)
+                position += SECTION.size
+    except (struct.error, ValueError):
+        return None
+
+    graph = Graph.from_parts(parts)
+    # Keep the mapping open for as long as the graph is alive
+    graph.buffer = buffer
+    return graph
+
+
+def section(view, position, typecode):
+    """
+    Returns the array described by the section entry at `position`.
+    Raises ValueError if it does not lie within `view` or does not hold
+    a whole number of items.
+    """
+    offset, length = SECTION.unpack_from(view, position)
+    if offset + length > len(view) or \
+            length % struct.calcsize(typecode):
+        raise ValueError(f"bad snapshot section at {position}")
+    return view[offset:offset + length].cast(typecode)
+
+
+def write(graph, path, stamp):
+    """
+    Writes `graph` to a snapshot at `path` tagged with fingerprint
+    `stamp`. The file is replaced atomically, so readers never see a
+    partially written snapshot.
+    """
+    arrays = []
+    for name in Graph.PARTS:
+        value = getattr(graph, name)
+        if name in STRINGS:
+            offsets, blob = encode(value)
+            arrays.extend([offsets, blob])
+        else:
+            arrays.append(array(INDEX, value))
+
+    position = HEADER.size + len(arrays) * SECTION.size
+    sections = []
+    for values in arrays:
+        position = align(position)
+        size = len(values) * values.itemsize
+        sections.append((position, size))
+        position += size
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, sys.byteorder[0].encode(), *stamp
+            ))
+            for offset, size in sections:
+                f.write(SECTION.pack(offset, size))
+            for (offset, size), values in zip(sections, arrays):
+                f.write(bytes(offset - f.tell()))
+                values.tofile(f)
+        os.replace(temporary, path)
+    except BaseException:
+        # Leave no half-written file behind
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def encode(strings):
+    """
+    Returns (offsets, blob) arrays holding `strings` as UTF-8.
+    """
+    if isinstance(strings, StringTable):
+        return array("Q", strings.offsets), array("B", strings.blob)
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for string in strings:
+        blob += string.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, array("B", blob)
+
+
+def align(position, boundary=8):
+    """
+    Rounds `position` up to a multiple of `boundary`.
+    """
+    return -(-position // boundary) * boundary
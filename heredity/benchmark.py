@@ -0,0 +1,122 @@
+import glob
+import os
+import random
+import sys
+import time
+
+import heredity
+from inference import marginals
+from vectorized import enumerate_arrays
+
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python benchmark.py [directory]")
+    directory = sys.argv[1] if len(sys.argv) == 2 else "data"
+
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        people = heredity.load_data(path)
+        expected = heredity.enumerate_probabilities(people)
+        for name, solver in [
+            ("loop", heredity.enumerate_probabilities),
+            ("vectorized", lambda people: enumerate_arrays(
+                people, heredity.PROBS
+            )),
+            ("elimination", lambda people: marginals(
+                people, heredity.PROBS
+            )),
+        ]:
+            seconds, probabilities = timed(solver, people)
+            print(
+                f"{os.path.basename(path):>12} {name:>12}: "
+                f"{seconds * 1000:8.2f} ms, max difference "
+                f"{difference(probabilities, expected):.1e}"
+            )
+
+    print("Generating synthetic family...")
+    compare_workers(synthetic_family(8, seed=1))
+
+
+def compare_workers(people, counts=(1, 2, 4, 8)):
+    """
+    Prints the time to enumerate `people` in one process and on each
+    number of worker processes in `counts`, with the speedup and whether
+    the result is identical to that of one worker.
+    """
+    seconds, _ = timed(heredity.enumerate_probabilities, people, repeat=1)
+    print(f"{len(people)} people, in process: {seconds:.2f}s")
+    expected = None
+    for workers in counts:
+        parallel_seconds, probabilities = timed(
+            lambda people: heredity.parallel_probabilities(people, workers),
+            people, repeat=1
+        )
+        expected = expected or probabilities
+        print(
+            f"  {workers} workers: {parallel_seconds:.2f}s, "
+            f"{seconds / parallel_seconds:.2f}x, "
+            f"{'identical' if probabilities == expected else 'DIFFERENT'}"
+        )
+
+
+def synthetic_family(n, seed=0, observed=0.3):
+    """
+    Returns `n` people in the form of `heredity.load_data`, each couple
+    a descendant and someone marrying into the family, with an
+    `observed` fraction of traits known.
+    """
+    rng = random.Random(seed)
+    people = {}
+
+    def add(mother, father):
+        name = f"person{len(people)}"
+        people[name] = {
+            "name": name, "mother": mother, "father": father,
+            "trait": rng.choice([True, False])
+            if rng.random() < observed else None,
+        }
+        return name
+
+    generation = [add(None, None)]
+    while len(people) < n:
+        children = []
+        for person in generation:
+            # A spouse only joins along with at least one child
+            if len(people) + 2 > n:
+                break
+            spouse = add(None, None)
+            for _ in range(rng.randint(1, 3)):
+                if len(people) < n:
+                    children.append(add(person, spouse))
+        generation = children or [add(None, None)]
+    return people
+
+
+def timed(solver, people, repeat=5):
+    """
+    Returns the best of `repeat` wall times of `solver(people)`, and its
+    result.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = solver(people)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def difference(probabilities, expected):
+    """
+    Returns the largest difference between two sets of probabilities.
+    """
+    return max(
+        abs(probabilities[person][field][value] - p)
+        for person in expected
+        for field in expected[person]
+        for value, p in expected[person][field].items()
+    )
+
+
+if __name__ == "__main__":
+    main()
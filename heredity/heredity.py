@@ -1,6 +1,10 @@
+import argparse
 import csv
 import itertools
-import sys
+import os
+from multiprocessing import Pool
+
+from inference import marginals, tables
 
 PROBS = {
 
@@ -36,60 +40,202 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Parts the enumeration is split into when run on several processes
+SHARDS = 64
+
 
 def main():
-    # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Infer gene and trait probabilities in a family."
+    )
+    parser.add_argument("data")
+    method = parser.add_mutually_exclusive_group()
+    method.add_argument("--enumerate", action="store_true",
+                        help="sum over every assignment of genes and "
+                             "traits instead of eliminating variables")
+    method.add_argument("--vectorized", action="store_true",
+                        help="sum over every assignment as with "
+                             "--enumerate, in batches of NumPy arrays")
+    method.add_argument("--workers", type=int,
+                        help="sum over every assignment as with "
+                             "--enumerate, on this many processes")
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    people = load_data(args.data)
+
+    if args.enumerate:
+        probabilities = enumerate_probabilities(people)
+    elif args.workers is not None:
+        probabilities = parallel_probabilities(people, args.workers)
+    elif args.vectorized:
+        # Only this mode needs NumPy, so only import it here
+        from vectorized import enumerate_arrays
+        probabilities = enumerate_arrays(people, PROBS)
+    else:
+        probabilities = marginals(people, PROBS)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def enumerate_probabilities(people):
+    """
+    Return the gene and trait distributions of everyone in `people` by
+    summing the joint probability of every assignment consistent with
+    the known traits, which takes O(2^n * 3^n) calls for n people.
+
+    Assignments come lazily from `assignments` as bitmasks, so memory
+    stays constant however many there are.
+    """
+    return probabilities_from(people, *totals(people, PROBS))
+
+
+def parallel_probabilities(people, workers=None, shards=SHARDS):
+    """
+    Return the same as `enumerate_probabilities`, with the assignments
+    split into `shards` shards enumerated on a pool of `workers`
+    processes. Each shard's totals are added up in shard order, so the
+    result does not depend on the number of workers.
+    """
+    with Pool(workers or os.cpu_count()) as pool:
+        partials = pool.starmap(totals, [
+            (people, PROBS, shard, shards) for shard in range(shards)
+        ])
+    genes_total, traits_total = partials[0]
+    for genes_partial, traits_partial in partials[1:]:
+        for total, partial in zip(genes_total + traits_total,
+                                  genes_partial + traits_partial):
+            total[:] = [a + b for a, b in zip(total, partial)]
+    return probabilities_from(people, genes_total, traits_total)
+
+
+def totals(people, probs, shard=0, shards=1):
+    """
+    Return (genes_total, traits_total): for each person, the sum of the
+    joint probabilities of the assignments in `shard` of `shards` that
+    give them each gene count and each trait, as lists indexed by count
+    and by False and True.
+    """
+    names = list(people)
+    bits = [1 << i for i in range(len(names))]
+    family = [
+        (bit, None if people[name]["mother"] is None else (
+            bits[names.index(people[name]["mother"])],
+            bits[names.index(people[name]["father"])]
+        ))
+        for bit, name in zip(bits, names)
+    ]
+    compiled = tables(probs)
 
     # Keep track of gene and trait probabilities for each person
+    genes_total = [[0, 0, 0] for _ in names]
+    traits_total = [[0, 0] for _ in names]
+    for one_gene, two_genes, have_trait in assignments(
+            people, shard, shards):
+        p = mask_probability(family, one_gene, two_genes, have_trait,
+                             compiled)
+        for bit, gene_total, trait_total in zip(
+                bits, genes_total, traits_total):
+            gene_total[mask_genes(bit, one_gene, two_genes)] += p
+            trait_total[bool(have_trait & bit)] += p
+    return genes_total, traits_total
+
+
+def probabilities_from(people, genes_total, traits_total):
+    """
+    Return the probabilities of `people` in the form `main` prints, from
+    the totals of `totals`, normalized.
+    """
     probabilities = {
-        person: {
-            "gene": {
-                2: 0,
-                1: 0,
-                0: 0
-            },
-            "trait": {
-                True: 0,
-                False: 0
-            }
+        name: {
+            "gene": {g: gene_total[g] for g in (2, 1, 0)},
+            "trait": {True: trait_total[1], False: trait_total[0]},
         }
-        for person in people
+        for name, gene_total, trait_total in zip(
+            people, genes_total, traits_total)
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
+    # Ensure probabilities sum to 1
+    normalize(probabilities)
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    return probabilities
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
 
-    # Ensure probabilities sum to 1
-    normalize(probabilities)
+def assignments(people, shard=0, shards=1):
+    """
+    Yield every assignment of genes and traits consistent with the
+    traits known in `people` as (one_gene, two_genes, have_trait)
+    bitmasks, bit i standing for the i-th person. Known traits are fixed
+    up front, so only people with an unknown trait vary.
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    With `shards`, only the assignments of `shard` are yielded: the
+    pairs of traits and one_gene are dealt out to the shards in turn.
+    """
+    names = list(people)
+    everyone = (1 << len(names)) - 1
+    known = unknown = 0
+    for i, name in enumerate(names):
+        if people[name]["trait"] is None:
+            unknown |= 1 << i
+        elif people[name]["trait"]:
+            known |= 1 << i
+
+    position = 0
+    for traits in submasks(unknown):
+        for one_gene in submasks(everyone):
+            if position % shards == shard:
+                for two_genes in submasks(everyone & ~one_gene):
+                    yield one_gene, two_genes, known | traits
+            position += 1
+
+
+def submasks(mask):
+    """
+    Yield every subset of the bits set in `mask`, from all of them down
+    to none.
+    """
+    subset = mask
+    while True:
+        yield subset
+        if subset == 0:
+            return
+        subset = (subset - 1) & mask
+
+
+def mask_probability(family, one_gene, two_genes, have_trait, compiled):
+    """
+    Return the same as `joint_probability` for bitmasks, given `family`
+    as a (bit, parents) pair per person, `parents` being None or the
+    bits of the mother and father, and the `compiled` tables.
+    """
+    prior, inheritance, trait = compiled
+
+    joint_probability = 1
+    for bit, parents in family:
+        count = mask_genes(bit, one_gene, two_genes)
+        if parents is None:
+            inherited = prior[count]
+        else:
+            inherited = inheritance[
+                mask_genes(parents[0], one_gene, two_genes)
+            ][mask_genes(parents[1], one_gene, two_genes)][count]
+        joint_probability *= trait[count][bool(have_trait & bit)] * inherited
+
+    return joint_probability
+
+
+def mask_genes(bit, one_gene, two_genes):
+    """
+    Return how many copies of the gene the person at `bit` has.
+    """
+    return 1 if one_gene & bit else 2 if two_genes & bit else 0
 
 
 def load_data(filename):
@@ -116,14 +262,15 @@ def load_data(filename):
 
 def powerset(s):
     """
-    Return a list of all possible subsets of set s.
+    Return an iterator over all possible subsets of set s, each made only
+    when it is reached.
     """
     s = list(s)
-    return [
+    return (
         set(s) for s in itertools.chain.from_iterable(
             itertools.combinations(s, r) for r in range(len(s) + 1)
         )
-    ]
+    )
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -136,101 +283,34 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone not in `one_gene` or `two_gene` does not have the gene, and
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
-    """
-    joint_probability = 1
 
-    for p in people.keys():
-        prob = 1
-        detail = people[p]
-        mother = detail.get("mother")
-        father = detail.get("father")
-        trait = False
-        if p in have_trait:
-            trait = True
-
-        if p in one_gene:
-            prob *= PROBS["trait"][1][trait]
-            if mother is None:
-                prob *= PROBS["gene"][1]
-            else:
-                if mother in one_gene:
-                    prob *= 0.5
-                elif mother in two_genes:
-                    if father in one_gene:
-                        prob *= 0.5
-                    elif father in two_genes:
-                        prob *= 2 * (PROBS["mutation"] * (1 - PROBS["mutation"]))
-                    else:
-                        prob *= (1 - PROBS["mutation"]) * (1 - PROBS["mutation"]) + \
-                                (PROBS["mutation"]) * (PROBS["mutation"])
-                else:
-                    if father in one_gene:
-                        prob *= 0.5
-                    elif father in two_genes:
-                        prob *= (1 - PROBS["mutation"]) * (1 - PROBS["mutation"]) + \
-                                (PROBS["mutation"]) * (PROBS["mutation"])
-                    else:
-                        prob *= 2 * (PROBS["mutation"] * (1 - PROBS["mutation"]))
-
-        elif p in two_genes:
-            prob *= PROBS["trait"][2][trait]
-            if mother is None:
-                prob *= PROBS["gene"][2]
-            else:
-                if mother in one_gene:
-                    if father in one_gene:
-                        prob *= 0.5 * 0.5
-                    elif father in two_genes:
-                        prob *= 0.5 * (1 - PROBS["mutation"])
-                    else:
-                        prob *= 0.5 * PROBS["mutation"]
-                elif mother in two_genes:
-                    if father in one_gene:
-                        prob *= 0.5 * (1 - PROBS["mutation"])
-                    elif father in two_genes:
-                        prob *= (1 - PROBS["mutation"]) * (1 - PROBS["mutation"])
-                    else:
-                        prob *= (1 - PROBS["mutation"]) * PROBS["mutation"]
-                else:
-                    if father in one_gene:
-                        prob *= 0.5 * PROBS["mutation"]
-                    elif father in two_genes:
-                        prob *= (1 - PROBS["mutation"]) * PROBS["mutation"]
-                    else:
-                        prob *= PROBS["mutation"] * PROBS["mutation"]
+    Each factor is looked up in the tables compiled from `PROBS`, which
+    are rebuilt whenever it changes.
+    """
+    prior, inheritance, trait = tables(PROBS)
 
+    joint_probability = 1
+    for person, detail in people.items():
+        count = genes(person, one_gene, two_genes)
+        mother = detail["mother"]
+        if mother is None:
+            inherited = prior[count]
         else:
-            prob *= PROBS["trait"][0][trait]
-            if mother is None:
-                prob *= PROBS["gene"][0]
-            else:
-                if mother in one_gene:
-                    if father in one_gene:
-                        prob *= 0.5 * 0.5
-                    elif father in two_genes:
-                        prob *= 0.5 * PROBS["mutation"]
-                    else:
-                        prob *= 0.5 * (1 - PROBS["mutation"])
-                elif mother in two_genes:
-                    if father in one_gene:
-                        prob *= 0.5 * PROBS["mutation"]
-                    elif father in two_genes:
-                        prob *= PROBS["mutation"] * PROBS["mutation"]
-                    else:
-                        prob *= PROBS["mutation"] * (1 - PROBS["mutation"])
-                else:
-                    if father in one_gene:
-                        prob *= 0.5 * (1 - PROBS["mutation"])
-                    elif father in two_genes:
-                        prob *= PROBS["mutation"] * (1 - PROBS["mutation"])
-                    else:
-                        prob *= (1 - PROBS["mutation"]) * (1 - PROBS["mutation"])
-
-        joint_probability *= prob
+            inherited = inheritance[genes(mother, one_gene, two_genes)][
+                genes(detail["father"], one_gene, two_genes)
+            ][count]
+        joint_probability *= trait[count][person in have_trait] * inherited
 
     return joint_probability
 
 
+def genes(person, one_gene, two_genes):
+    """
+    Return how many copies of the gene `person` has.
+    """
+    return 1 if person in one_gene else 2 if person in two_genes else 0
+
+
 def update(probabilities, one_gene, two_genes, have_trait, p):
     """
     Add to `probabilities` a new joint probability `p`.
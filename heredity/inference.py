@@ -0,0 +1,222 @@
+import itertools
+
+# Copies of the gene a person can have
+GENES = (0, 1, 2)
+
+# Tables built by `tables`, keyed by the probabilities they came from
+table_cache = {}
+
+
+class Factor():
+    """
+    A nonnegative function of some people's gene counts: `table` maps
+    each assignment of counts to `variables`, as a tuple in the same
+    order, to a value.
+    """
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+    @classmethod
+    def product(cls, factors, variables=()):
+        """
+        Returns the product of `factors`, over all of their variables
+        and any others in `variables`, on which it is constant.
+        """
+        variables = list(variables)
+        for factor in factors:
+            variables.extend(
+                v for v in factor.variables if v not in variables
+            )
+        lookups = [
+            (factor.table, [variables.index(v) for v in factor.variables])
+            for factor in factors
+        ]
+        table = {}
+        for assignment in itertools.product(GENES, repeat=len(variables)):
+            value = 1
+            for factor_table, positions in lookups:
+                value *= factor_table[tuple(assignment[i] for i in positions)]
+            table[assignment] = value
+        return cls(variables, table)
+
+    def project(self, variables):
+        """
+        Returns this factor with every variable but `variables` summed
+        out.
+        """
+        positions = [self.variables.index(v) for v in variables]
+        table = dict.fromkeys(
+            itertools.product(GENES, repeat=len(positions)), 0
+        )
+        for assignment, value in self.table.items():
+            table[tuple(assignment[i] for i in positions)] += value
+        return Factor(variables, table)
+
+    def normalized(self):
+        """
+        Returns this factor scaled to sum to 1, which keeps the values of
+        long chains of messages from underflowing.
+        """
+        total = sum(self.table.values())
+        if total == 0:
+            return self
+        return Factor(self.variables, {
+            assignment: value / total
+            for assignment, value in self.table.items()
+        })
+
+
+def marginals(people, probs):
+    """
+    Returns the distribution of each person's gene count and trait given
+    the traits observed in `people`, as loaded by `heredity.load_data`,
+    in the same form as the probabilities `heredity.main` computes by
+    enumeration.
+
+    Each person contributes one factor: the chance of their gene count
+    given their parents' (or from the population if they have none),
+    times the chance of their trait if it was observed. Variables are
+    eliminated in min-degree order, and the messages passed along the
+    way are sent back down again, junction-tree style, so one forward
+    and one backward pass give every person's marginal at once. The work
+    grows with the number of people, exponentially only in how tangled
+    the pedigree is, rather than as 2^n * 3^n.
+    """
+    _, _, trait = tables(probs)
+    factors = [person_factor(people, person, probs) for person in people]
+    order = elimination_order(factors)
+
+    # Eliminate each variable in turn, keeping the original factors its
+    # cluster took and the messages it took from earlier clusters
+    scopes = []
+    local = []
+    incoming = []
+    pool = [(factor, None) for factor in factors]
+    for i, variable in enumerate(order):
+        taken = [item for item in pool if variable in item[0].variables]
+        pool = [item for item in pool if variable not in item[0].variables]
+        local.append([factor for factor, sender in taken if sender is None])
+        incoming.append({
+            sender: factor for factor, sender in taken if sender is not None
+        })
+        cluster = Factor.product([factor for factor, _ in taken])
+        scopes.append(cluster.variables)
+        message = cluster.project(
+            [v for v in cluster.variables if v != variable]
+        )
+        pool.append((message.normalized(), i))
+
+    # Send messages back down, from the last cluster to the first, so
+    # each cluster hears from the whole pedigree
+    down = [[] for _ in order]
+    genes = {}
+    for j in reversed(range(len(order))):
+        for i, message in incoming[j].items():
+            others = [m for k, m in incoming[j].items() if k != i]
+            down[i] = [Factor.product(
+                local[j] + others + down[j], scopes[j]
+            ).project(message.variables).normalized()]
+        belief = Factor.product(
+            local[j] + list(incoming[j].values()) + down[j]
+        )
+        genes[order[j]] = belief.project((order[j],)).normalized()
+
+    probabilities = {}
+    for person in people:
+        gene = {g: genes[person].table[(g,)] for g in (2, 1, 0)}
+        observed = people[person]["trait"]
+        if observed is None:
+            chance = sum(gene[g] * trait[g][True] for g in GENES)
+            traits = {True: chance, False: 1 - chance}
+        else:
+            traits = {True: float(observed), False: float(not observed)}
+        probabilities[person] = {"gene": gene, "trait": traits}
+    return probabilities
+
+
+def tables(probs):
+    """
+    Returns (prior, inheritance, trait) tables for `probs`, built once
+    for each distinct value of it and rebuilt whenever it changes:
+    `prior[g]` is the chance of `g` copies of the gene with no known
+    parents, `inheritance[m][f][g]` that of `g` copies given a mother
+    with `m` and a father with `f`, and `trait[g][t]` that of trait `t`
+    given `g` copies, `t` being False or True.
+    """
+    gene, trait = probs["gene"], probs["trait"]
+    key = (
+        gene[0], gene[1], gene[2],
+        trait[0][False], trait[0][True], trait[1][False], trait[1][True],
+        trait[2][False], trait[2][True], probs["mutation"]
+    )
+    if key not in table_cache:
+        table_cache[key] = (
+            key[0:3], inheritance(probs), (key[3:5], key[5:7], key[7:9])
+        )
+    return table_cache[key]
+
+
+def inheritance(probs):
+    """
+    Returns the probability of a child's gene count given their parents'
+    counts as a 3x3x3 table indexed [mother][father][child]. Each parent
+    passes the gene on with probability 0.5 per copy, and a passed copy,
+    or its absence, mutates with probability `probs["mutation"]`.
+    """
+    mutation = probs["mutation"]
+    passes = (mutation, 0.5, 1 - mutation)
+    return tuple(
+        tuple(
+            ((1 - m) * (1 - f), m * (1 - f) + (1 - m) * f, m * f)
+            for f in passes
+        )
+        for m in passes
+    )
+
+
+def person_factor(people, person, probs):
+    """
+    Returns the factor of `person`: the probability of their gene count
+    given their parents' counts, or from the population if their parents
+    are unknown, times that of their trait if observed.
+    """
+    prior, inherit, trait = tables(probs)
+    observed = people[person]["trait"]
+    evidence = {
+        g: 1 if observed is None else trait[g][observed] for g in GENES
+    }
+    mother = people[person]["mother"]
+    father = people[person]["father"]
+    if mother is None:
+        return Factor((person,), {
+            (g,): prior[g] * evidence[g] for g in GENES
+        })
+    return Factor((mother, father, person), {
+        (m, f, g): inherit[m][f][g] * evidence[g]
+        for m, f, g in itertools.product(GENES, repeat=3)
+    })
+
+
+def elimination_order(factors):
+    """
+    Returns the variables of `factors` in min-degree order: each time,
+    the variable sharing a factor with the fewest others still left,
+    ties broken by name. Its neighbours then become connected, as its
+    elimination leaves a factor over all of them.
+    """
+    neighbours = {}
+    for factor in factors:
+        for v in factor.variables:
+            neighbours.setdefault(v, set()).update(factor.variables)
+            neighbours[v].discard(v)
+
+    order = []
+    while neighbours:
+        variable = min(neighbours, key=lambda v: (len(neighbours[v]), v))
+        around = neighbours.pop(variable)
+        for v in around:
+            neighbours[v] |= around - {v}
+            neighbours[v].discard(variable)
+        order.append(variable)
+    return order
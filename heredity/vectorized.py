@@ -0,0 +1,94 @@
+import numpy as np
+
+from inference import tables
+
+# Assignments evaluated together as one batch of arrays
+CHUNK = 1 << 14
+
+
+def enumerate_arrays(people, probs, chunk=CHUNK):
+    """
+    Returns the same probabilities as `heredity.enumerate_probabilities`,
+    evaluating the joint probability of `chunk` assignments at a time.
+
+    Assignment `k` is encoded as an integer: its base-3 digits are the
+    gene counts of everyone, and its remaining base-2 digits the traits
+    of those whose trait is unknown. A batch decodes into (assignments x
+    people) arrays of genes and traits, and the log joint probability of
+    each row is a sum of gathers from the tables of `inference.tables`.
+    Weighted `np.bincount`s then add each row into every person's gene
+    and trait totals, in place of `update`.
+    """
+    names = list(people)
+    n = len(names)
+    index = {name: i for i, name in enumerate(names)}
+    prior, inheritance, trait = (np.array(table) for table in tables(probs))
+    with np.errstate(divide="ignore"):
+        log_prior = np.log(prior)
+        log_inheritance = np.log(inheritance)
+        log_trait = np.log(trait)
+
+    founders = [i for i, name in enumerate(names)
+                if people[name]["mother"] is None]
+    children = [i for i, name in enumerate(names)
+                if people[name]["mother"] is not None]
+    mothers = [index[people[names[i]]["mother"]] for i in children]
+    fathers = [index[people[names[i]]["father"]] for i in children]
+    observed = np.array([
+        bool(people[name]["trait"]) for name in names
+    ], dtype=np.int64)
+    unknown = [i for i, name in enumerate(names)
+               if people[name]["trait"] is None]
+
+    gene_powers = 3 ** np.arange(n, dtype=np.int64)
+    trait_powers = 2 ** np.arange(len(unknown), dtype=np.int64)
+    total = 3 ** n * 2 ** len(unknown)
+    gene_offsets = 3 * np.arange(n)
+    trait_offsets = 2 * np.arange(n)
+
+    # Totals are kept relative to exp(`scale`), the largest weight so
+    # far, so that leaving log space can neither underflow nor overflow
+    genes_total = np.zeros(3 * n)
+    traits_total = np.zeros(2 * n)
+    scale = -np.inf
+    for first in range(0, total, chunk):
+        k = np.arange(first, min(first + chunk, total), dtype=np.int64)
+        genes = k[:, None] // gene_powers % 3
+        traits = np.broadcast_to(observed, genes.shape).copy()
+        traits[:, unknown] = k[:, None] // (3 ** n * trait_powers) % 2
+
+        log_joint = (
+            log_trait[genes, traits].sum(axis=1) +
+            log_prior[genes[:, founders]].sum(axis=1) +
+            log_inheritance[
+                genes[:, mothers], genes[:, fathers], genes[:, children]
+            ].sum(axis=1)
+        )
+        top = log_joint.max()
+        if top == -np.inf:
+            continue
+        if top > scale:
+            genes_total *= np.exp(scale - top)
+            traits_total *= np.exp(scale - top)
+            scale = top
+        weights = np.repeat(np.exp(log_joint - scale), n)
+        genes_total += np.bincount(
+            (genes + gene_offsets).ravel(), weights, minlength=3 * n
+        )
+        traits_total += np.bincount(
+            (traits + trait_offsets).ravel(), weights, minlength=2 * n
+        )
+
+    # The normalization, as a reduction over each person's values
+    genes_total = genes_total.reshape(n, 3)
+    traits_total = traits_total.reshape(n, 2)
+    genes_total /= genes_total.sum(axis=1, keepdims=True)
+    traits_total /= traits_total.sum(axis=1, keepdims=True)
+    return {
+        name: {
+            "gene": {g: genes_total[i, g].item() for g in (2, 1, 0)},
+            "trait": {t: traits_total[i, int(t)].item()
+                      for t in (True, False)},
+        }
+        for i, name in enumerate(names)
+    }
@@ -0,0 +1,276 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import incremental
+from matrix import (
+    EXTRAPOLATIONS, METHODS, LinkMatrix, converge, power_iteration
+)
+from parallel import ParallelMatrix
+from pagerank import generate_sample, sample_pagerank, transition_model
+
+DAMPING = 0.85
+
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python benchmark.py [edges]")
+    edges = int(sys.argv[1]) if len(sys.argv) == 2 else 5_000_000
+
+    # The dictionary solver expands dangling pages into links to every
+    # page, so it is only practical on small graphs
+    pages, sources, targets = random_graph(5_000, 50_000)
+    corpus = to_corpus(pages, sources, targets)
+
+    start = time.perf_counter()
+    expected = dict_iterate_pagerank(corpus, DAMPING)
+    dict_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = LinkMatrix.from_corpus(corpus)
+    ranks = matrix.ranks(power_iteration(matrix, DAMPING))
+    matrix_seconds = time.perf_counter() - start
+
+    error = max(abs(ranks[page] - expected[page]) for page in expected)
+    print(
+        f"5,000 pages, 50,000 links: dict {dict_seconds:.2f}s, "
+        f"matrix {matrix_seconds:.2f}s, max difference {error:.2e}"
+    )
+
+    # Sampling, where the original walk rebuilt the model on every step
+    start = time.perf_counter()
+    dict_sample_pagerank(corpus, DAMPING, 2_000)
+    dict_seconds = (time.perf_counter() - start) / 2_000
+    start = time.perf_counter()
+    sample_pagerank(corpus, DAMPING, 200_000)
+    table_seconds = (time.perf_counter() - start) / 200_000
+    start = time.perf_counter()
+    sample_pagerank(corpus, DAMPING, 2_000_000, surfers=10_000)
+    surf_seconds = (time.perf_counter() - start) / 2_000_000
+    print(
+        f"Sampling: dict {dict_seconds * 1e6:.2f}us, "
+        f"tables {table_seconds * 1e6:.2f}us, "
+        f"surfers {surf_seconds * 1e6:.3f}us per sample"
+    )
+
+    compare_incremental(*random_graph(50_000, 500_000))
+
+    # Millions of links straight from arrays, skipping the dictionary
+    pages, sources, targets = random_graph(edges // 10, edges)
+    start = time.perf_counter()
+    matrix = LinkMatrix(pages, sources, targets)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    rank = power_iteration(matrix, DAMPING)
+    iterate_seconds = time.perf_counter() - start
+    print(
+        f"{len(pages):,} pages, {edges:,} links: build {build_seconds:.2f}s, "
+        f"iterate {iterate_seconds:.2f}s, sum {rank.sum():.6f}"
+    )
+    compare_convergence(matrix)
+    compare_batched(matrix)
+    compare_workers(matrix)
+
+
+def compare_convergence(matrix, tolerance=1e-10):
+    """
+    Prints how many iterations and how long each update method and
+    extrapolation takes to bring the L1 change under `tolerance`, how
+    far the result is from a far tighter solution, and the change made
+    by every fifth iteration.
+    """
+    reference, _ = converge(matrix, DAMPING, 1e-15, norm="l1", max_iter=1000)
+    for method in METHODS:
+        for extrapolation in EXTRAPOLATIONS:
+            trace = []
+            start = time.perf_counter()
+            rank, iterations = converge(
+                matrix, DAMPING, tolerance, norm="l1", method=method,
+                extrapolation=extrapolation, trace=trace
+            )
+            seconds = time.perf_counter() - start
+            error = np.abs(rank - reference).sum()
+            changes = " ".join(f"{change:.0e}" for change in trace[::5])
+            print(
+                f"  {method:12} {str(extrapolation):9} {iterations:3} "
+                f"iterations {seconds:6.2f}s error {error:.1e}: {changes}"
+            )
+
+
+def compare_incremental(pages, sources, targets, changes=20,
+                        tolerance=1e-9):
+    """
+    Rewires `changes` pages of a graph whose ranks were stored by a cold
+    `incremental.update`, prints the work the incremental update takes
+    and exits unless its ranks are within `tolerance` of a cold start on
+    the rewired graph.
+    """
+    corpus = to_corpus(pages, sources, targets)
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, incremental.FILENAME)
+        incremental.update(corpus, DAMPING, path, tolerance)
+        for page in rng.sample(pages, changes):
+            corpus[page] = set(rng.sample(pages, rng.randrange(10)))
+        ranks, report = incremental.update(corpus, DAMPING, path, tolerance)
+
+    matrix = LinkMatrix.from_corpus(corpus)
+    expected, _ = converge(matrix, DAMPING, tolerance)
+    error = max(
+        abs(ranks[page] - value)
+        for page, value in zip(matrix.pages, expected.tolist())
+    )
+    print(
+        f"Incremental update after rewiring {changes} pages: "
+        f"{report['iterations']} iterations against "
+        f"{report['cold_iterations']} cold, max difference {error:.1e}"
+    )
+    if error > tolerance:
+        sys.exit("Incremental ranks differ from a cold start.")
+
+
+def compare_batched(matrix, columns=32, seeds=10, tolerance=1e-10):
+    """
+    Prints the time to solve `columns` personalized PageRank vectors, each
+    teleporting to `seeds` random pages, together and one at a time.
+    """
+    rng = np.random.default_rng(0)
+    teleport = np.zeros((len(matrix), columns))
+    for k in range(columns):
+        teleport[rng.choice(len(matrix), seeds, replace=False), k] = 1 / seeds
+
+    start = time.perf_counter()
+    together, iterations = converge(
+        matrix, DAMPING, tolerance, teleport=teleport
+    )
+    batched_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    error = 0
+    for k in range(columns):
+        rank, _ = converge(
+            matrix, DAMPING, tolerance, teleport=teleport[:, k].copy()
+        )
+        error = max(error, np.abs(rank - together[:, k]).max())
+    single_seconds = time.perf_counter() - start
+    print(
+        f"{columns} personalized vectors: batched {batched_seconds:.2f}s "
+        f"({iterations} iterations), one at a time {single_seconds:.2f}s, "
+        f"max difference {error:.1e}"
+    )
+
+
+def compare_workers(matrix, counts=(1, 2, 4, 8), tolerance=1e-10):
+    """
+    Prints the time to iterate `matrix` with each number of worker
+    processes in `counts`, its speedup over a single process without a
+    pool, and whether the ranks are identical to that process's.
+    """
+    start = time.perf_counter()
+    expected, iterations = converge(matrix, DAMPING, tolerance)
+    single_seconds = time.perf_counter() - start
+    print(f"{iterations} iterations in process: {single_seconds:.2f}s")
+    for workers in counts:
+        with ParallelMatrix(matrix, workers) as parallel:
+            start = time.perf_counter()
+            rank, _ = converge(parallel, DAMPING, tolerance)
+            seconds = time.perf_counter() - start
+        same = np.array_equal(rank, expected)
+        print(
+            f"  {workers} workers: {seconds:.2f}s, "
+            f"{single_seconds / seconds:.2f}x, "
+            f"{'identical' if same else 'DIFFERENT'}"
+        )
+
+
+def random_graph(n, edges, dangling=0.1, seed=0, uniform=False):
+    """
+    Returns (pages, sources, targets) for `n` pages and about `edges`
+    links drawn with a heavy-tailed choice of target, or a uniform one
+    if `uniform`, leaving a `dangling` fraction of pages without
+    out-links.
+    """
+    rng = np.random.default_rng(seed)
+    pages = [f"{i}.html" for i in range(n)]
+    linking = rng.permutation(n)[int(dangling * n):]
+    sources = rng.choice(linking, size=edges)
+    if uniform:
+        targets = rng.integers(n, size=edges)
+    else:
+        targets = (rng.pareto(1.5, size=edges) * n / 20).astype(np.int64) % n
+
+    # Drop self-links and duplicates, as a crawl would
+    keep = sources != targets
+    pairs = np.unique(np.stack([sources[keep], targets[keep]]), axis=1)
+    return pages, pairs[0], pairs[1]
+
+
+def to_corpus(pages, sources, targets):
+    """
+    Returns the corpus dictionary of pages and the sets they link to.
+    """
+    corpus = {page: set() for page in pages}
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        corpus[pages[source]].add(pages[target])
+    return corpus
+
+
+def dict_sample_pagerank(corpus, damping_factor, n):
+    """
+    The original `sample_pagerank`, which builds a transition model over
+    every page for each sample, kept as a baseline.
+    """
+    page_rank = dict.fromkeys(corpus, 0)
+    page = random.choice(list(corpus))
+    page_rank[page] += 1
+    for _ in range(n - 1):
+        page = generate_sample(transition_model(corpus, page, damping_factor))
+        page_rank[page] += 1
+    return {page: count / n for page, count in page_rank.items()}
+
+
+def dict_iterate_pagerank(corpus, damping_factor):
+    """
+    The original dictionary implementation of `iterate_pagerank`, kept
+    as a baseline. It works on a copy since it rewrites dangling pages.
+    """
+    corpus = {page: set(links) for page, links in corpus.items()}
+    N = len(corpus)
+    page_rank = dict.fromkeys(corpus, 1 / N)
+
+    numlinks = dict()
+    transpose = dict()
+    for i in corpus:
+        if len(corpus[i]) == 0:
+            corpus[i] = set(corpus.keys())
+        numlinks[i] = len(corpus[i])
+        transpose[i] = set()
+
+    for i in corpus:
+        for j in corpus[i]:
+            transpose[j].add(i)
+
+    while True:
+        new_pagerank = dict()
+        for i in corpus:
+            new_pagerank[i] = (1 - damping_factor) / N
+            for j in transpose[i]:
+                new_pagerank[i] += damping_factor * page_rank[j] / numlinks[j]
+
+        flag = True
+        for i in corpus:
+            if abs(new_pagerank[i] - page_rank[i]) > 0.001:
+                flag = False
+            page_rank[i] = new_pagerank[i]
+        if flag:
+            break
+
+    return page_rank
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import graphfile
+
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Bump whenever the layout below changes so stale indexes are discarded
+VERSION = 1
+
+FILENAME = "pagerank-links.json"
+
+# Characters read from a page at a time
+CHUNK = 1 << 16
+
+# Pages whose links are held in memory at a time when writing a graph file
+PAGES = 1024
+
+
+def crawl(directory, workers=None, cache=None):
+    """
+    Returns the same dictionary as `pagerank.crawl`, extracting links on
+    a pool of `workers` threads, one per CPU by default. With `cache`,
+    the path of an index file, the links of each file are kept there
+    along with its modification time and size, and only files whose
+    time or size changed are read again.
+    """
+    index = load(cache) if cache else {}
+
+    files = {}
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".html") and entry.is_file():
+            stat = entry.stat()
+            files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+    stale = [
+        filename for filename, key in files.items()
+        if filename not in index or
+        (index[filename]["mtime_ns"], index[filename]["size"]) != key
+    ]
+    paths = [os.path.join(directory, filename) for filename in stale]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            extracted = list(pool.map(extract_links, paths))
+    else:
+        # Threads only add overhead on a single core
+        extracted = map(extract_links, paths)
+    for filename, links in zip(stale, extracted):
+        mtime_ns, size = files[filename]
+        index[filename] = {
+            "mtime_ns": mtime_ns, "size": size, "links": sorted(links)
+        }
+
+    removed = len(index) != len(files)
+    index = {filename: index[filename] for filename in files}
+    if cache and (stale or removed):
+        try:
+            save(cache, index)
+        except OSError:
+            # A read-only location can still be crawled, just not cached
+            pass
+
+    # Only include links to other pages in the corpus
+    return {
+        filename: (files.keys() & index[filename]["links"]) - {filename}
+        for filename in files
+    }
+
+
+def crawl_to_file(directory, path, workers=None):
+    """
+    Writes the links between the HTML pages in `directory` to a graph
+    file at `path` and returns its path. Pages are parsed `PAGES` at a
+    time, so the links are never all in memory. The file is kept as is
+    if no page changed since then.
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".html") and entry.is_file():
+            stat = entry.stat()
+            entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    stamp = graphfile.fingerprint(entries)
+    if graphfile.MappedMatrix.load(path, stamp) is not None:
+        return path
+
+    pages = sorted(name for name, _, _ in entries)
+    index = {page: i for i, page in enumerate(pages)}
+    workers = workers or os.cpu_count() or 1
+
+    def links(pool):
+        for first in range(0, len(pages), PAGES):
+            paths = [
+                os.path.join(directory, page)
+                for page in pages[first:first + PAGES]
+            ]
+            extracted = pool.map(extract_links, paths) if pool else \
+                map(extract_links, paths)
+            for page, found in enumerate(extracted, first):
+                # Only include links to other pages in the corpus
+                yield page, [
+                    index[link] for link in found
+                    if link in index and index[link] != page
+                ]
+
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            graphfile.write(path, pages, links(pool), stamp)
+    else:
+        graphfile.write(path, pages, links(None), stamp)
+    return path
+
+
+def extract_links(path, chunk=CHUNK):
+    """
+    Returns the set of link targets in the HTML file at `path`, reading
+    it `chunk` characters at a time. Every tag is complete up to the
+    last ">" of a chunk, so the first "<" after it, which may begin a
+    tag cut in two, is where the text carried over to the next starts.
+    """
+    links = set()
+    tail = ""
+    with open(path) as f:
+        while True:
+            data = f.read(chunk)
+            if not data:
+                break
+            text = tail + data
+            cut = text.find("<", text.rfind(">") + 1)
+            if cut == -1:
+                cut = len(text)
+            links.update(LINK.findall(text, 0, cut))
+            tail = text[cut:]
+    links.update(LINK.findall(tail))
+    return links
+
+
+def load(path):
+    """
+    Returns the link index stored at `path`, or an empty one if it is
+    missing or from another version.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get("version") != VERSION:
+        return {}
+    return index["files"]
+
+
+def save(path, index):
+    """
+    Writes the link index to `path`, replacing any previous file
+    atomically.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION, "files": index}, f)
+    os.replace(temporary, path)
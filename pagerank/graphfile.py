@@ -0,0 +1,296 @@
+import hashlib
+import os
+import struct
+import sys
+from collections.abc import Sequence
+
+import numpy as np
+
+from matrix import LinkMatrix, row_groups
+
+# Bump whenever the layout below changes so stale files are rebuilt
+VERSION = 1
+
+MAGIC = b"PAGERANK"
+
+# Magic, version, byte order, pages, links, stamp of the crawled files
+HEADER = struct.Struct("<8sIcQQ8s")
+
+# Offset and length in bytes of one stored array
+SECTION = struct.Struct("<QQ")
+
+# Stored arrays, in order: page names as offsets into a UTF-8 blob, then
+# the links as in-link CSR like LinkMatrix, plus out-degrees
+PARTS = ("name_offsets", "names", "indptr", "out_degree", "sources")
+
+FILENAME = "pagerank.graph"
+
+# Links held in memory at a time, when writing or iterating
+BLOCK = 1 << 20
+
+
+class MappedMatrix(LinkMatrix):
+    """
+    A LinkMatrix whose links stay in a memory-mapped graph file. Ranks
+    are kept in memory, one value per page, but the links are read a
+    block of rows at a time, so memory does not grow with their number.
+    """
+    def __init__(self, path, parts):
+        self.path = path
+        self.pages = PageNames(parts["name_offsets"], parts["names"])
+        self.indptr = parts["indptr"]
+        self.out_degree = parts["out_degree"]
+        self.sources = parts["sources"]
+
+        self.dangling = np.flatnonzero(self.out_degree == 0)
+        with np.errstate(divide="ignore"):
+            self.inverse_degree = np.where(
+                self.out_degree > 0, 1 / self.out_degree, 0.0
+            )
+        self.linked = np.flatnonzero(np.diff(self.indptr))
+        self.starts = np.asarray(self.indptr[self.linked])
+
+        # Rows split so that each block holds at most BLOCK links
+        self.bounds = [0]
+        n = len(self.pages)
+        while self.bounds[-1] < n:
+            a = self.bounds[-1]
+            b = np.searchsorted(self.indptr, self.indptr[a] + BLOCK, "right")
+            self.bounds.append(min(n, max(a + 1, int(b) - 1)))
+
+    @classmethod
+    def load(cls, path, stamp=None):
+        """
+        Returns the matrix stored at `path`, or None if it is missing,
+        from another version, or was written from files that no longer
+        match `stamp`.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+                magic, version, byteorder, n, m, found = \
+                    HEADER.unpack(header)
+                sections = [
+                    SECTION.unpack(f.read(SECTION.size)) for _ in PARTS
+                ]
+        except (OSError, struct.error):
+            return None
+        if (magic != MAGIC or version != VERSION or
+                byteorder != sys.byteorder[0].encode() or
+                (stamp is not None and found != stamp)):
+            return None
+
+        parts = {}
+        for name, (offset, size) in zip(PARTS, sections):
+            dtype = dtype_of(name, n)
+            parts[name] = np.memmap(
+                path, dtype=dtype, mode="r", offset=offset,
+                shape=(size // np.dtype(dtype).itemsize,)
+            ) if size else np.zeros(0, dtype=dtype)
+        return cls(path, parts)
+
+    def sweep_bounds(self, blocks):
+        """
+        Returns the same blocks as `LinkMatrix.sweep_bounds`, split
+        further where needed so that none holds more than `BLOCK` links.
+        """
+        return np.union1d(super().sweep_bounds(blocks), self.bounds)
+
+    def inflow(self, rank):
+        """
+        Returns the same as `LinkMatrix.inflow`, reading the links one
+        block at a time.
+        """
+        flow = np.zeros(rank.shape)
+        shares = rank * self.per_page(self.inverse_degree, rank)
+        cuts = np.searchsorted(self.linked, self.bounds)
+        for (a, b), (la, lb) in zip(zip(self.bounds, self.bounds[1:]),
+                                    zip(cuts, cuts[1:])):
+            if lb == la:
+                continue
+            first = self.indptr[a]
+            sources = np.asarray(self.sources[first:self.indptr[b]])
+            rows = self.linked[la:lb]
+            starts = self.starts[la:lb] - first
+            if rank.ndim == 1:
+                flow[rows] = np.add.reduceat(shares[sources], starts)
+            else:
+                for group, links in row_groups(rows, starts, sources):
+                    flow[group] = shares[links].sum(axis=1)
+        return flow
+
+
+class PageNames(Sequence):
+    """
+    Page names decoded on demand from a UTF-8 blob and its offsets.
+    """
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+
+def fingerprint(entries):
+    """
+    Returns an 8-byte digest of (name, mtime_ns, size) `entries`, which
+    changes whenever a page is added, removed or modified.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for name, mtime_ns, size in sorted(entries):
+        digest.update(f"{name}\0{mtime_ns}\0{size}\n".encode("utf-8"))
+    return digest.digest()
+
+
+def write(path, pages, links, stamp=bytes(8)):
+    """
+    Writes a graph file to `path` for the list of `pages`, given `links`
+    as an iterable of (page, targets) positions in page order. Links are
+    spooled to disk and then transposed a block at a time, so only the
+    page arrays are ever held whole. The file is replaced atomically.
+    """
+    n = len(pages)
+    index = dtype_of("sources", n)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    spool = f"{path}.{os.getpid()}.links"
+
+    try:
+        in_degree, out_degree = spool_links(spool, n, links)
+        m = int(out_degree.sum())
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(in_degree, out=indptr[1:])
+
+        encoded = [page.encode("utf-8") for page in pages]
+        name_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+        names = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays = [
+            name_offsets, names, indptr,
+            out_degree.astype(dtype_of("out_degree", n))
+        ]
+
+        position = HEADER.size + len(PARTS) * SECTION.size
+        sections = []
+        for size in [values.nbytes for values in arrays] + \
+                [m * np.dtype(index).itemsize]:
+            position = align(position)
+            sections.append((position, size))
+            position += size
+
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, sys.byteorder[0].encode(), n, m, stamp
+            ))
+            for section in sections:
+                f.write(SECTION.pack(*section))
+            for (offset, _), values in zip(sections, arrays):
+                f.seek(offset)
+                values.tofile(f)
+            f.truncate(position)
+
+        if m:
+            sources = np.memmap(
+                temporary, dtype=index, mode="r+", offset=sections[-1][0],
+                shape=(m,)
+            )
+            transpose(spool, sources, indptr, out_degree)
+            sources.flush()
+            del sources
+        os.replace(temporary, path)
+    finally:
+        for leftover in (spool, temporary):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def spool_links(spool, n, links):
+    """
+    Writes the targets of `links`, deduplicated, to file `spool` in page
+    order, and returns the (in_degree, out_degree) arrays of the pages.
+    """
+    index = dtype_of("sources", n)
+    in_degree = np.zeros(n, dtype=np.int64)
+    out_degree = np.zeros(n, dtype=np.int64)
+    pending = []
+    buffered = 0
+    with open(spool, "wb") as f:
+        for page, targets in links:
+            targets = np.unique(np.asarray(list(targets), dtype=index))
+            out_degree[page] = len(targets)
+            pending.append(targets)
+            buffered += len(targets)
+            if buffered >= BLOCK:
+                flush(f, pending, in_degree)
+                buffered = 0
+        flush(f, pending, in_degree)
+    return in_degree, out_degree
+
+
+def transpose(spool, sources, indptr, out_degree):
+    """
+    Fills `sources` with the in-link rows described by `indptr` from the
+    out-links in file `spool`, a block at a time. Out-links arrive in
+    page order, so the sources within each row end up sorted.
+    """
+    n = len(out_degree)
+    spooled = np.memmap(spool, dtype=sources.dtype, mode="r",
+                        shape=sources.shape)
+    fill = indptr[:-1].copy()
+    out_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(out_degree, out=out_indptr[1:])
+    for first in range(0, len(spooled), BLOCK):
+        targets = np.asarray(spooled[first:first + BLOCK])
+        owners = np.searchsorted(
+            out_indptr, np.arange(first, first + len(targets)), "right"
+        ) - 1
+        order = np.argsort(targets, kind="stable")
+        targets = targets[order]
+
+        # Position of each link among those in this block to its target
+        new = np.flatnonzero(np.diff(targets, prepend=-1))
+        within = np.arange(len(targets)) - np.repeat(
+            new, np.diff(np.append(new, len(targets)))
+        )
+        sources[fill[targets] + within] = owners[order]
+        fill += np.bincount(targets, minlength=n)
+
+
+def flush(f, pending, in_degree):
+    """
+    Appends the `pending` arrays of targets to spool file `f`, counts
+    them into `in_degree` and empties `pending`.
+    """
+    if pending:
+        targets = np.concatenate(pending)
+        in_degree += np.bincount(targets, minlength=len(in_degree))
+        targets.tofile(f)
+        pending.clear()
+
+
+def dtype_of(part, n):
+    """
+    Returns the type stored for `part` in a graph of `n` pages.
+    """
+    if part == "names":
+        return np.uint8
+    if part in ("name_offsets", "indptr"):
+        return np.int64
+    return np.int32 if n < 2 ** 31 else np.int64
+
+
+def align(position):
+    """
+    Rounds `position` up to a multiple of 8 bytes.
+    """
+    return (position + 7) // 8 * 8
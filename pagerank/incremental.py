@@ -0,0 +1,193 @@
+import json
+import os
+
+import numpy as np
+
+from matrix import LinkMatrix, converge
+
+# Bump whenever the layout below changes so stale states are discarded
+VERSION = 1
+
+FILENAME = "pagerank.json"
+
+
+class RankState():
+    """
+    The ranks last computed for a corpus, with the links they were
+    computed from and how many iterations a cold start took.
+    """
+    def __init__(self, damping_factor, tolerance, iterations, ranks, links):
+        self.damping_factor = damping_factor
+        self.tolerance = tolerance
+        self.iterations = iterations
+        self.ranks = ranks
+        self.links = links
+
+    def save(self, path):
+        """
+        Writes the state to `path`, replacing any previous file atomically.
+        """
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": VERSION,
+                "damping_factor": self.damping_factor,
+                "tolerance": self.tolerance,
+                "iterations": self.iterations,
+                "ranks": self.ranks,
+                "links": self.links,
+            }, f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns the state stored at `path`, or None if it is missing or
+        from another version.
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get("version") != VERSION:
+            return None
+        return cls(
+            state["damping_factor"], state["tolerance"],
+            state["iterations"], state["ranks"], state["links"]
+        )
+
+
+def update(corpus, damping_factor, path, tolerance=0.001):
+    """
+    Returns (ranks, report) for `corpus`, starting from the state stored
+    at `path` if it was computed with the same settings, and stores the
+    new state there.
+
+    Only pages whose links changed since the stored state are pushed
+    again: the difference they make to the ranks is spread outwards from
+    them, touching just the pages it reaches, until none holds more than
+    `tolerance`. Full iterations then finish off from there, with the
+    same stopping criterion as a cold start. `report` counts the work in
+    full iterations, each pushed page being one page of an iteration,
+    next to the iterations of the last cold start.
+    """
+    matrix = LinkMatrix.from_corpus(corpus)
+    pages = matrix.pages
+    links = {
+        page: sorted(link for link in corpus[page] if link in corpus)
+        for page in pages
+    }
+    state = RankState.load(path)
+
+    if state is None or state.damping_factor != damping_factor or \
+            state.tolerance != tolerance:
+        rank, iterations = converge(matrix, damping_factor, tolerance)
+        RankState(
+            damping_factor, tolerance, iterations, matrix.ranks(rank), links
+        ).save(path)
+        return matrix.ranks(rank), {
+            "mode": "cold",
+            "iterations": iterations,
+            "cold_iterations": iterations,
+            "saved": 0,
+            "changed": len(pages),
+            "rounds": 0,
+            "pushed": 0,
+        }
+
+    changed = [page for page in pages if state.links.get(page) != links[page]]
+    if set(state.ranks) == set(pages):
+        rank = np.array([state.ranks[page] for page in pages])
+        residual = link_residual(
+            matrix, state.links, links, changed, rank, damping_factor
+        )
+    else:
+        # Pages came or went, which moves the teleport term of every
+        # page, so take the residual of a whole step instead
+        rank = np.array([state.ranks.get(page, 0.0) for page in pages])
+        rank[rank == 0] = 1 / len(pages)
+        rank /= rank.sum()
+        residual = matrix.step(rank, damping_factor) - rank
+
+    rank, rounds, pushed = push(
+        matrix, rank, residual, damping_factor, tolerance
+    )
+    rank, iterations = converge(matrix, damping_factor, tolerance, rank)
+    RankState(
+        damping_factor, tolerance, state.iterations, matrix.ranks(rank), links
+    ).save(path)
+    work = iterations + pushed / len(pages)
+    return matrix.ranks(rank), {
+        "mode": "incremental",
+        "iterations": round(work, 2),
+        "cold_iterations": state.iterations,
+        "saved": round(state.iterations - work, 2),
+        "changed": len(changed),
+        "rounds": rounds,
+        "pushed": pushed,
+    }
+
+
+def link_residual(matrix, old_links, new_links, changed, rank,
+                  damping_factor):
+    """
+    Returns how much one more step would change `rank`, which was
+    converged for `old_links`, now that the pages in `changed` link to
+    `new_links` instead. The even amount that pages gaining or losing
+    all their links add to every page is left out, as `push` leaves it
+    to renormalization.
+    """
+    index = {page: i for i, page in enumerate(matrix.pages)}
+    residual = np.zeros(len(matrix))
+    for page in changed:
+        share = damping_factor * rank[index[page]]
+        for links, sign in ((old_links.get(page, []), -1),
+                            (new_links[page], 1)):
+            links = [index[link] for link in links if link in index]
+            if links:
+                np.add.at(residual, links, sign * share / len(links))
+    return residual
+
+
+def push(matrix, rank, residual, damping_factor, tolerance):
+    """
+    Returns (rank, rounds, pushed) after moving `residual` into `rank`
+    and along links, round by round, until no page is left holding more
+    than `tolerance`. Only pages over the tolerance are touched in each
+    round; `pushed` counts them.
+    """
+    indptr, targets = matrix.out_links()
+    degree = matrix.out_degree
+    rank = rank.copy()
+    rounds = pushed = 0
+
+    while True:
+        frontier = np.flatnonzero(np.abs(residual) > tolerance)
+        if len(frontier) == 0:
+            break
+        rounds += 1
+        pushed += len(frontier)
+
+        values = residual[frontier]
+        residual[frontier] = 0
+        rank[frontier] += values
+
+        dangling = degree[frontier] == 0
+        linked = frontier[~dangling]
+        counts = degree[linked]
+        shares = damping_factor * values[~dangling] / counts
+
+        # Positions in `targets` of every link of every linked page
+        ends = np.cumsum(counts)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(
+            indptr[linked] - ends + counts, counts
+        )
+        np.add.at(residual, targets[positions], np.repeat(shares, counts))
+
+    # Dangling pages spread what they hold evenly over every page, which
+    # is the teleport term scaled, so it settles in proportion to the new
+    # ranks themselves, as does the mass of the residual too small to
+    # push: renormalizing accounts for both
+    rank += residual
+    return rank / rank.sum(), rounds, pushed
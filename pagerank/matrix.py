@@ -0,0 +1,365 @@
+import numpy as np
+
+# How the change between iterations is measured, for each column
+NORMS = {
+    "max": lambda change: np.abs(change).max(axis=0),
+    "l1": lambda change: np.abs(change).sum(axis=0),
+}
+
+# Update schemes, and extrapolations that can be applied along the way
+METHODS = ("jacobi", "gauss-seidel")
+EXTRAPOLATIONS = (None, "aitken", "quadratic")
+
+# Iterations between extrapolations, counted after the first
+PERIOD = 10
+
+# Pages updated together in a Gauss-Seidel sweep
+BLOCKS = 64
+
+# Links gathered at a time when summing the in-links of several columns
+GROUP = 1 << 16
+
+
+class LinkMatrix():
+    """
+    The link structure of a corpus as a compressed sparse row matrix of
+    in-links: the pages linking to page `i` are
+    `sources[indptr[i]:indptr[i + 1]]`. Pages without outgoing links are
+    kept in `dangling` rather than expanded into links to every page.
+    """
+    def __init__(self, pages, sources, targets):
+        """
+        Build the matrix for `pages` from parallel arrays of link
+        `sources` and `targets`, given as positions in `pages`.
+        """
+        self.pages = list(pages)
+        n = len(self.pages)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        index = np.int32 if n < 2 ** 31 else np.int64
+
+        order = np.argsort(targets, kind="stable")
+        self.sources = sources[order].astype(index)
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=n), out=self.indptr[1:])
+
+        self.out_degree = np.bincount(sources, minlength=n)
+        self.dangling = np.flatnonzero(self.out_degree == 0)
+        with np.errstate(divide="ignore"):
+            self.inverse_degree = np.where(
+                self.out_degree > 0, 1 / self.out_degree, 0.0
+            )
+
+        # Rows with at least one in-link, and where each one starts
+        self.linked = np.flatnonzero(np.diff(self.indptr))
+        self.starts = self.indptr[self.linked]
+
+        # The same rows grouped by `row_groups`, once several columns
+        # are first iterated together
+        self.groups = None
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Returns the matrix for a corpus dictionary mapping each page to
+        the set of pages it links to. Links to pages outside the corpus
+        are ignored.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        sources = []
+        targets = []
+        for page in pages:
+            i = index[page]
+            for link in corpus[page]:
+                j = index.get(link)
+                if j is not None:
+                    sources.append(i)
+                    targets.append(j)
+        return cls(pages, sources, targets)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def inflow(self, rank):
+        """
+        Returns, for every page, the total rank flowing into it along
+        links when each page splits `rank` evenly over its out-links.
+        `rank` may also be a matrix with one rank vector per column.
+        """
+        if rank.ndim == 2:
+            # Each link fetches a whole row of shares, for every column
+            # at once, and rows with as many in-links are summed together
+            if self.groups is None:
+                self.groups = row_groups(
+                    self.linked, self.starts, self.sources
+                )
+            shares = np.multiply(
+                rank, self.inverse_degree[:, None], order="C"
+            )
+            flow = np.zeros(rank.shape)
+            for rows, sources in self.groups:
+                flow[rows] = shares[sources].sum(axis=1)
+            return flow
+
+        flow = np.zeros(len(self))
+        if len(self.sources):
+            shares = (rank * self.inverse_degree)[self.sources]
+            flow[self.linked] = np.add.reduceat(shares, self.starts)
+        return flow
+
+    def step(self, rank, damping_factor, teleport=None):
+        """
+        Returns the rank vector after one PageRank update of `rank`.
+        A dangling page spreads its rank over every page, which is added
+        as a single constant instead of materialized links.
+
+        With `teleport`, a distribution over pages shaped like `rank`,
+        random jumps and dangling pages follow it instead of going to
+        every page alike.
+        """
+        n = len(self)
+        if teleport is None:
+            spread = rank[self.dangling].sum(axis=0) / n
+            return (
+                (1 - damping_factor) / n +
+                damping_factor * (self.inflow(rank) + spread)
+            )
+        dangling = rank[self.dangling].sum(axis=0)
+        return (
+            (1 - damping_factor) * teleport +
+            damping_factor * (self.inflow(rank) + dangling * teleport)
+        )
+
+    def sweep(self, rank, damping_factor, teleport=None, blocks=BLOCKS):
+        """
+        Updates `rank` in place, Gauss-Seidel style: pages are updated a
+        block at a time in order, each block already seeing the new ranks
+        of the blocks before it. With as many blocks as pages this is
+        plain Gauss-Seidel; fewer blocks keep the work in NumPy.
+        """
+        n = len(self)
+        if teleport is None:
+            teleport = np.full(rank.shape, 1 / n)
+        inverse_degree = self.per_page(self.inverse_degree, rank)
+        shares = rank * inverse_degree
+        is_dangling = self.out_degree == 0
+        dangling = rank[is_dangling].sum(axis=0)
+        bounds = self.sweep_bounds(blocks)
+        cuts = np.searchsorted(self.linked, bounds)
+
+        for (a, b), (la, lb) in zip(zip(bounds, bounds[1:]),
+                                    zip(cuts, cuts[1:])):
+            flow = np.zeros((b - a,) + rank.shape[1:])
+            if lb > la:
+                first = self.indptr[a]
+                segment = shares[self.sources[first:self.indptr[b]]]
+                flow[self.linked[la:lb] - a] = np.add.reduceat(
+                    segment, self.starts[la:lb] - first
+                )
+            new = (1 - damping_factor) * teleport[a:b] + damping_factor * (
+                flow + dangling * teleport[a:b]
+            )
+            dangling += (new - rank[a:b])[is_dangling[a:b]].sum(axis=0)
+            rank[a:b] = new
+            shares[a:b] = new * inverse_degree[a:b]
+        return rank
+
+    def sweep_bounds(self, blocks):
+        """
+        Returns the first page of each of the `blocks` blocks a sweep
+        updates in turn, and then the number of pages.
+        """
+        n = len(self)
+        return np.linspace(0, n, min(blocks, n) + 1).astype(np.int64)
+
+    def teleport(self, weights):
+        """
+        Returns the teleport distribution over the pages given by
+        `weights`, as in `teleport_vector`.
+        """
+        return teleport_vector(self.pages, weights)
+
+    @staticmethod
+    def per_page(values, rank):
+        """
+        Returns `values`, one per page, shaped to broadcast against
+        `rank` whether it is a vector or a matrix of columns.
+        """
+        return values if rank.ndim == 1 else values[:, None]
+
+    def out_links(self):
+        """
+        Returns (indptr, targets), the same links as a compressed sparse
+        row matrix of out-links: page `i` links to
+        `targets[indptr[i]:indptr[i + 1]]`.
+        """
+        targets = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        order = np.argsort(self.sources, kind="stable")
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(self.out_degree, out=indptr[1:])
+        return indptr, targets[order]
+
+    def ranks(self, vector):
+        """
+        Returns `vector` as a dictionary keyed by page.
+        """
+        return dict(zip(self.pages, vector.tolist()))
+
+
+def teleport_vector(pages, weights):
+    """
+    Returns a teleport distribution over `pages`, in their order, from
+    `weights`, a dictionary of page weights or an iterable of seed pages
+    to weigh equally. Pages not among `pages` are ignored.
+    """
+    if not isinstance(weights, dict):
+        weights = dict.fromkeys(weights, 1)
+    vector = np.array([float(weights.get(page, 0)) for page in pages])
+    if (vector < 0).any() or vector.sum() <= 0:
+        raise ValueError("teleport weights must be positive somewhere "
+                         "and negative nowhere")
+    return vector / vector.sum()
+
+
+def row_groups(rows, starts, sources):
+    """
+    Returns the in-links of `rows`, those of row `rows[i]` being
+    `sources[starts[i]:starts[i + 1]]`, the last running to the end, as
+    a list of (rows, sources) pairs: some rows with the same number of
+    in-links, and a matrix of their sources with one row for each. No
+    group holds many more than `GROUP` links.
+
+    NumPy's `reduceat` sums the segments of a matrix's columns several
+    times slower than those of vectors, but `shares[sources].sum(axis=1)`
+    sums a whole group of equal segments in one vectorized call.
+    """
+    if len(rows) == 0:
+        return []
+    lengths = np.diff(np.append(starts, len(sources)))
+    order = np.argsort(lengths, kind="stable")
+    edges = np.flatnonzero(np.diff(lengths[order])) + 1
+    groups = []
+    for a, b in zip(np.append(0, edges), np.append(edges, len(order))):
+        width = int(lengths[order[a]])
+        size = max(1, GROUP // width)
+        for first in range(a, b, size):
+            chosen = order[first:min(first + size, b)]
+            positions = starts[chosen][:, None] + np.arange(width)
+            groups.append((rows[chosen], sources[positions]))
+    return groups
+
+
+def power_iteration(matrix, damping_factor, tolerance=0.001):
+    """
+    Returns the PageRank vector of `matrix`, starting from the uniform
+    distribution and updating until no value changes by more than
+    `tolerance`.
+    """
+    return converge(matrix, damping_factor, tolerance)[0]
+
+
+def converge(matrix, damping_factor, tolerance=0.001, rank=None,
+             norm="max", max_iter=None, method="jacobi", extrapolation=None,
+             trace=None, teleport=None):
+    """
+    Returns (rank, iterations) after updating `rank`, or `teleport` if
+    None, until the change made by an iteration is at most `tolerance`
+    under `norm`, or `max_iter` iterations have run.
+
+    `teleport` defaults to every page alike. Given as a matrix with one
+    distribution per column, all of them are solved together, and the
+    change is that of the column that changed most. A column is left as
+    it is once its own change is within `tolerance`.
+
+    `method` is one of `METHODS`. Every `PERIOD` iterations the estimate
+    can be extrapolated from the last few with Aitken's delta-squared
+    process or quadratic extrapolation. If `trace` is a list, the change
+    made by each iteration is appended to it.
+    """
+    if norm not in NORMS:
+        raise ValueError(f"unknown norm: {norm}")
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method}")
+    if extrapolation not in EXTRAPOLATIONS:
+        raise ValueError(f"unknown extrapolation: {extrapolation}")
+    measure = NORMS[norm]
+
+    n = len(matrix)
+    if rank is None:
+        rank = np.full(n, 1 / n) if teleport is None else teleport.copy()
+    if rank.ndim == 2:
+        # Columns that have converged are moved out into `result`, and
+        # only the rest, listed in `columns`, are iterated any further
+        result = rank.copy()
+        columns = np.arange(rank.shape[1])
+    history = [rank]
+    iterations = 0
+    while max_iter is None or iterations < max_iter:
+        if method == "jacobi":
+            new_rank = matrix.step(rank, damping_factor, teleport)
+        else:
+            # The total drifts from 1 and otherwise only recovers by a
+            # factor of `damping_factor` per sweep
+            new_rank = matrix.sweep(rank.copy(), damping_factor, teleport)
+            new_rank /= new_rank.sum(axis=0)
+        iterations += 1
+
+        changes = measure(new_rank - rank)
+        change = changes.max()
+        if trace is not None:
+            trace.append(change)
+        rank = new_rank
+        if change <= tolerance:
+            break
+
+        history = history[-3:] + [rank]
+        if rank.ndim == 2 and (changes <= tolerance).any():
+            keep = changes > tolerance
+            result[:, columns[~keep]] = rank[:, ~keep]
+            columns = columns[keep]
+            rank, teleport = (
+                None if x is None else np.ascontiguousarray(x[:, keep])
+                for x in (rank, teleport)
+            )
+            history = [x[:, keep] for x in history[:-1]] + [rank]
+        if extrapolation is not None and iterations % PERIOD == 0:
+            rank = extrapolate(history, extrapolation)
+            history = [rank]
+
+    if rank.ndim == 2:
+        result[:, columns] = rank
+        return result, iterations
+    return rank, iterations
+
+
+def extrapolate(history, extrapolation):
+    """
+    Returns an estimate of the limit of the iterates in `history`, oldest
+    first, by `extrapolation`. Too short a history is returned as is.
+    """
+    if history[-1].ndim == 2 and extrapolation == "quadratic":
+        return np.stack([
+            extrapolate([x[:, k] for x in history], extrapolation)
+            for k in range(history[-1].shape[1])
+        ], axis=1)
+    if extrapolation == "aitken" and len(history) >= 3:
+        x0, x1, x2 = history[-3:]
+        second = x2 - 2 * x1 + x0
+        safe = np.abs(second) > 1e-300
+        limit = x2.copy()
+        limit[safe] -= (x2 - x1)[safe] ** 2 / second[safe]
+    elif extrapolation == "quadratic" and len(history) >= 4:
+        # Kamvar et al., treating the last four iterates as combinations
+        # of the three leading eigenvectors
+        x0, x1, x2, x3 = history[-4:]
+        y = np.stack([x1 - x0, x2 - x0], axis=1)
+        g1, g2 = np.linalg.lstsq(y, -(x3 - x0), rcond=None)[0]
+        b0, b1, b2 = g1 + g2 + 1, g2 + 1, 1
+        limit = b0 * x1 + b1 * x2 + b2 * x3
+    else:
+        return history[-1]
+
+    # Extrapolating can overshoot below zero, which no rank can be
+    limit = np.maximum(limit, 0)
+    return limit / limit.sum(axis=0)
@@ -1,54 +1,123 @@
+import argparse
 import os
 import random
-import re
-import sys
+
+import numpy as np
+
+import crawler
+import incremental
+from graphfile import MappedMatrix
+from matrix import (
+    EXTRAPOLATIONS, METHODS, NORMS, LinkMatrix, converge, teleport_vector
+)
+from parallel import ParallelMatrix
+from sampling import (
+    TransitionTables, monte_carlo, sample_counts, surf_counts
+)
 
 DAMPING = 0.85
 SAMPLES = 10000
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    parser = argparse.ArgumentParser(
+        description="Rank the pages of a corpus by sampling and iteration."
+    )
+    parser.add_argument("corpus")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="sample and iterate on this many processes")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="stop sampling once every 95%% confidence "
+                             "interval is this narrow")
+    parser.add_argument("--threshold", type=float, default=0.001,
+                        help="stop iterating once an iteration changes "
+                             "the ranks by no more than this")
+    parser.add_argument("--norm", choices=list(NORMS), default="max")
+    parser.add_argument("--max-iter", type=int, default=None)
+    parser.add_argument("--method", choices=METHODS, default="jacobi")
+    parser.add_argument("--extrapolation",
+                        choices=[e for e in EXTRAPOLATIONS if e])
+    parser.add_argument("--trace", action="store_true",
+                        help="print the change made by each iteration")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="keep extracted links in this file, so only "
+                             "changed pages are parsed again")
+    parser.add_argument("--mapped", metavar="PATH",
+                        help="iterate over a memory-mapped graph file "
+                             "written to this path")
+    parser.add_argument("--incremental", action="store_true",
+                        help="update the ranks stored in the corpus "
+                             "directory instead of iterating from scratch")
+    args = parser.parse_args()
+    trace = [] if args.trace else None
+
+    if args.mapped:
+        # Sampling needs every link in memory, so only iterate
+        ranks = iterate_mapped_pagerank(
+            args.corpus, args.mapped, DAMPING, tolerance=args.threshold,
+            norm=args.norm, max_iter=args.max_iter, method=args.method,
+            extrapolation=args.extrapolation, trace=trace
+        )
+        print("PageRank Results from Iteration")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+        for i, change in enumerate(trace or [], 1):
+            print(f"  iteration {i}: change {change:.3e}")
+        return
+
+    corpus = crawl(args.corpus, args.cache)
+    if args.workers is None and args.seed is None and \
+            args.tolerance is None:
+        ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+        print(f"PageRank Results from Sampling (n = {SAMPLES})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+    else:
+        ranks, intervals, n = parallel_sample_pagerank(
+            corpus, DAMPING, SAMPLES, args.workers, args.seed,
+            args.tolerance
+        )
+        print(f"PageRank Results from Sampling (n = {n})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f} ± {intervals[page]:.4f}")
+    if args.incremental:
+        ranks, report = incremental.update(
+            corpus, DAMPING, os.path.join(args.corpus, incremental.FILENAME)
+        )
+    else:
+        ranks = iterate_pagerank(
+            corpus, DAMPING, args.threshold, args.norm, args.max_iter,
+            args.method, args.extrapolation, trace, workers=args.workers
+        )
+    print("PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    if not args.incremental and args.trace:
+        for i, change in enumerate(trace, 1):
+            print(f"  iteration {i}: change {change:.3e}")
+    if args.incremental:
+        print(
+            f"{report['changed']} pages changed, {report['iterations']} "
+            f"iterations, {report['saved']} saved of "
+            f"{report['cold_iterations']} from a cold start"
+        )
 
 
-def crawl(directory):
+def crawl(directory, cache=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
-    """
-    pages = dict()
-
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
-
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
-        )
 
-    return pages
+    Links are extracted on a thread pool. Given a `cache` file, they are
+    kept there, so only pages changed since the last crawl are parsed
+    again.
+    """
+    return crawler.crawl(directory, cache=cache)
 
 
-def transition_model(corpus, page, damping_factor):
+def transition_model(corpus, page, damping_factor, teleport=None):
     """
     Return a probability distribution over which page to visit next,
     given a current page.
@@ -56,7 +125,27 @@ def transition_model(corpus, page, damping_factor):
     With probability `damping_factor`, choose a link at random
     linked to by `page`. With probability `1 - damping_factor`, choose
     a link at random chosen from all pages in the corpus.
+
+    With `teleport`, a dictionary of page weights or a list of seed
+    pages to weigh alike, the random choice, and the choice from a page
+    without links, follow those weights instead of treating all pages
+    alike. Pages outside the corpus are ignored.
     """
+    if teleport is not None:
+        pages = list(corpus)
+        jumps = dict(zip(pages, teleport_vector(pages, teleport).tolist()))
+        links = corpus[page]
+        probability = dict()
+        for i in corpus:
+            jump = jumps[i]
+            if links:
+                probability[i] = (1 - damping_factor) * jump
+                if i in links:
+                    probability[i] += damping_factor / len(links)
+            else:
+                probability[i] = jump
+        return probability
+
     #raise NotImplementedError
     N = len(corpus)
     probality = dict()
@@ -70,34 +159,59 @@ def transition_model(corpus, page, damping_factor):
             probality[i] = 1 / N
     return probality
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, surfers=None,
+                    teleport=None):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
 
+    The transition model is precomputed once, so that each sample costs
+    O(1) rather than a pass over the whole corpus. With `surfers`, that
+    many independent surfers are run in parallel with NumPy instead of
+    one, and `n` is rounded up to a multiple of `surfers`. Each of them
+    first walks uncounted steps to forget its starting page, which costs
+    `sampling.burn_in` steps per surfer on top of `n`. `teleport` weighs
+    the random jumps as in `transition_model`.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    # raise NotImplementedError
-    page_rank = dict()
-
-    for page in corpus:
-        page_rank[page] = 0
-
-    curr_page = random.choice(list(corpus.keys()))
-
-    page_rank[curr_page] += 1
-
-    for i in range(n - 1):
-        model = transition_model(corpus, curr_page, damping_factor)
-        curr_page = generate_sample(model)
-        page_rank[curr_page] += 1
-
-    for page in page_rank:
-        page_rank[page] /= n
-
-    return page_rank
+    tables = TransitionTables(corpus, damping_factor, teleport)
+    if surfers is None:
+        counts = sample_counts(tables, n)
+    else:
+        counts = surf_counts(
+            tables, n, surfers, np.random.default_rng()
+        ).tolist()
+    total = sum(counts)
+    return {
+        page: count / total for page, count in zip(tables.pages, counts)
+    }
+
+
+def parallel_sample_pagerank(corpus, damping_factor, n, workers=None,
+                             seed=None, tolerance=None):
+    """
+    Return (ranks, intervals, samples) from up to `n` samples taken in
+    independent batches on a pool of `workers` processes. `intervals`
+    maps each page to the half-width of a 95% confidence interval for
+    its rank, and sampling stops early once all are within `tolerance`
+    after at least `sampling.MIN_BATCHES` batches. The same `seed` gives
+    the same ranks for any number of workers.
+    """
+    batch = max(1, min(10000, n // 10))
+    counts, intervals = monte_carlo(
+        corpus, damping_factor, n, workers, seed, batch=batch,
+        tolerance=tolerance
+    )
+    pages = sorted(corpus)
+    total = int(counts.sum())
+    return (
+        {page: count / total for page, count in zip(pages, counts.tolist())},
+        dict(zip(pages, intervals.tolist())),
+        total
+    )
 
 
 def generate_sample(model):
@@ -111,60 +225,82 @@ def generate_sample(model):
 
     return None
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=0.001, norm="max",
+                     max_iter=None, method="jacobi", extrapolation=None,
+                     trace=None, teleport=None, workers=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
 
+    By default this repeats until no value changes by more than 0.001.
+    `tolerance`, `norm` ("max" or "l1") and `max_iter` change when to
+    stop, `method` may be "gauss-seidel" to update pages in place, and
+    `extrapolation` may be "aitken" or "quadratic" to jump ahead every
+    few iterations. If `trace` is a list, the change made by each
+    iteration is appended to it. `teleport` weighs the random jumps as in
+    `transition_model`.
+
+    With `workers`, the links are shared with that many processes, each
+    summing the rank flowing into one block of pages, for the same
+    result as a single process.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    # A page that has no links at all should be interpreted as having one
+    # link for every page in the corpus (including itself); the matrix
+    # handles that without adding those links to `corpus`
+    matrix = LinkMatrix.from_corpus(corpus)
+
+    if teleport is not None:
+        teleport = matrix.teleport(teleport)
+    options = dict(
+        norm=norm, max_iter=max_iter, method=method,
+        extrapolation=extrapolation, trace=trace, teleport=teleport
+    )
+    if workers is None:
+        rank, _ = converge(matrix, damping_factor, tolerance, **options)
+    else:
+        with ParallelMatrix(matrix, workers) as parallel:
+            rank, _ = converge(parallel, damping_factor, tolerance, **options)
+    return matrix.ranks(rank)
+
+
+def iterate_mapped_pagerank(directory, path, damping_factor, **options):
+    """
+    Return the same as `iterate_pagerank(crawl(directory), ...)`, but
+    through a graph file written to `path` and memory-mapped, so the
+    links never need to fit in memory. `options` are passed on as in
+    `iterate_pagerank`.
+    """
+    matrix = MappedMatrix.load(crawler.crawl_to_file(directory, path))
+    teleport = options.pop("teleport", None)
+    if teleport is not None:
+        teleport = matrix.teleport(teleport)
+    rank, _ = converge(matrix, damping_factor, teleport=teleport, **options)
+    return matrix.ranks(rank)
 
-#    raise NotImplementedError
-
-
-    N = len(corpus)
-    intial_rank = 1 / N
-    page_rank = dict.fromkeys(corpus,intial_rank)
-
-    #find number of out going links across each node
-    # A page that has no links at all should be interpreted as having one link for every page in the corpus (including itself)
-    numlinks = dict()
-    transpose = dict()
-    # transpose contains the dictionary in which key is webpage and value is list of webpages that link to this webpage
-    for i in corpus:
-        if len(corpus[i]) == 0:
-            corpus[i] = set(corpus.keys())
-        numlinks[i] = len(corpus[i])
-        transpose[i] = set()
-
-    for i in corpus:
-        for j in corpus[i]:
-            transpose[j].add(i)
 
-    #This process should repeat until no PageRank value changes by more than 0.001 between the current rank values and the new rank values.
-    while True:
-        new_pagerank = dict()
-        for i in corpus:
-            new_pagerank[i] = (1 - damping_factor) / N
-            for j in transpose[i]:
-                new_pagerank[i] += damping_factor * page_rank[j] / numlinks[j]
+def batch_pagerank(corpus, damping_factor, teleports, tolerance=0.001,
+                   **options):
+    """
+    Return a list with the personalized PageRank values of `corpus` for
+    each of `teleports`, weighed or listed as in `iterate_pagerank`.
 
-        sum = 0
-        flag = True
-        for i in corpus:
-            error = abs(new_pagerank[i] - page_rank[i])
-            if error > 0.001:
-                flag = False
-            page_rank[i] = new_pagerank[i]
-            sum += page_rank[i]
-         # sum must be 1
-         # print(sum)
-        if flag:
-            break
-
-    return page_rank
+    All of them are iterated together as the columns of one matrix, so
+    each pass over the links serves every one of them. Iteration stops
+    once the column that changed most is within `tolerance`; other
+    `options` are passed on as in `iterate_pagerank`.
+    """
+    matrix = LinkMatrix.from_corpus(corpus)
+    teleport = np.stack(
+        [matrix.teleport(weights) for weights in teleports], axis=1
+    )
+    rank, _ = converge(
+        matrix, damping_factor, tolerance, teleport=teleport, **options
+    )
+    return [matrix.ranks(rank[:, k]) for k in range(rank.shape[1])]
 
 if __name__ == "__main__":
     main()
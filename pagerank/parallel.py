@@ -0,0 +1,139 @@
+import os
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from matrix import LinkMatrix
+
+# Link arrays and per-iteration buffers placed in shared memory
+SHARED = ("sources", "linked", "starts", "indptr", "shares", "flow")
+
+worker_arrays = None
+
+
+class ParallelMatrix(LinkMatrix):
+    """
+    A LinkMatrix whose `inflow` is split over a pool of processes. Pages
+    are partitioned into one block of consecutive rows per worker, each
+    holding about as many links. The links, the shares of rank sent
+    along them and the resulting flow all live in shared memory, so
+    nothing but block numbers passes between processes per iteration.
+
+    Each row is still summed by one `np.add.reduceat` over the same
+    segment as in `LinkMatrix`, so the ranks match the single-process
+    solver exactly. Gauss-Seidel sweeps update blocks in order, so they
+    still run in this process. Use it as a context manager to shut the
+    pool down and free the shared memory.
+    """
+    def __init__(self, matrix, workers=None):
+        """
+        Share the links of LinkMatrix `matrix` with `workers` processes,
+        one per CPU by default.
+        """
+        self.pages = matrix.pages
+        self.out_degree = matrix.out_degree
+        self.dangling = matrix.dangling
+        self.inverse_degree = matrix.inverse_degree
+        self.workers = workers or os.cpu_count() or 1
+
+        n = len(self.pages)
+        arrays = {
+            "sources": matrix.sources,
+            "linked": matrix.linked,
+            "starts": matrix.starts,
+            "indptr": matrix.indptr,
+            "shares": np.zeros(n),
+            "flow": np.zeros(n),
+        }
+        self.memory = []
+        handles = {}
+        for name in SHARED:
+            array = arrays[name]
+            # Zero-sized segments are not allowed, so keep one spare byte
+            memory = shared_memory.SharedMemory(
+                create=True, size=max(1, array.nbytes)
+            )
+            self.memory.append(memory)
+            view = np.ndarray(array.shape, array.dtype, buffer=memory.buf)
+            view[:] = array
+            setattr(self, name, view)
+            handles[name] = (memory.name, array.dtype.str, array.shape)
+
+        # Rows split so that each block holds about as many links
+        m = int(self.indptr[-1])
+        goals = np.linspace(0, m, self.workers + 1)[1:-1]
+        self.bounds = np.concatenate((
+            [0], np.searchsorted(self.indptr, goals, "right") - 1, [n]
+        ))
+        self.bounds = np.maximum.accumulate(self.bounds)
+        self.cuts = np.searchsorted(self.linked, self.bounds)
+
+        self.pool = Pool(
+            self.workers, initializer=use_arrays,
+            initargs=(handles, self.bounds, self.cuts)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory.
+        """
+        self.pool.close()
+        self.pool.join()
+        for name in SHARED:
+            setattr(self, name, None)
+        for memory in self.memory:
+            memory.close()
+            memory.unlink()
+        self.memory = []
+
+    def inflow(self, rank):
+        """
+        Returns the same as `LinkMatrix.inflow`, each worker summing the
+        rows of its block.
+        """
+        if rank.ndim == 2:
+            return np.stack([
+                self.inflow(np.ascontiguousarray(column))
+                for column in rank.T
+            ], axis=1)
+        np.multiply(rank, self.inverse_degree, out=self.shares)
+        # Rows without in-links are never written, so they stay at zero
+        self.pool.map(inflow_block, range(self.workers), chunksize=1)
+        return self.flow.copy()
+
+
+def use_arrays(handles, bounds, cuts):
+    """
+    Pool initializer attaching to the shared arrays described by
+    `handles`, and keeping the block `bounds` and their `cuts` into the
+    linked rows.
+    """
+    global worker_arrays
+    worker_arrays = {"bounds": bounds, "cuts": cuts, "memory": []}
+    for name, (memory_name, dtype, shape) in handles.items():
+        memory = shared_memory.SharedMemory(name=memory_name)
+        worker_arrays["memory"].append(memory)
+        worker_arrays[name] = np.ndarray(shape, dtype, buffer=memory.buf)
+
+
+def inflow_block(block):
+    """
+    Writes the flow into the rows of `block` from the current shares.
+    """
+    arrays = worker_arrays
+    a, b = arrays["bounds"][block], arrays["bounds"][block + 1]
+    la, lb = arrays["cuts"][block], arrays["cuts"][block + 1]
+    if lb == la:
+        return
+    indptr = arrays["indptr"]
+    first = indptr[a]
+    sources = arrays["sources"][first:indptr[b]]
+    arrays["flow"][arrays["linked"][la:lb]] = np.add.reduceat(
+        arrays["shares"][sources], arrays["starts"][la:lb] - first
+    )
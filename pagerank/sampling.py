@@ -0,0 +1,310 @@
+import math
+import os
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from matrix import teleport_vector
+
+# Z score of a two-sided 95% confidence interval
+Z = 1.96
+
+# Student's t critical values of a two-sided 95% confidence interval for
+# the degrees of freedom the expansion in `t_critical` is too rough for
+T = {1: 12.706, 2: 4.303}
+
+# Fewest batches whose spread is trusted to stop sampling early
+MIN_BATCHES = 10
+
+# Surfers started afresh walk until their distance from the stationary
+# distribution is at most this before their visits count
+BIAS = 1e-4
+
+# Most steps a surfer walks before counting, for damping factors near 1
+MAX_BURN_IN = 1000
+
+# The tables of the corpus being sampled, in each pool process
+worker_tables = None
+
+
+class AliasTable():
+    """
+    Walker's alias method: after O(n) setup, draws from a fixed discrete
+    distribution over 0..n-1 in O(1) with one uniform index and one coin.
+    """
+    def __init__(self, weights):
+        """
+        Build the table for `weights`, which need not sum to 1.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        total = weights.sum()
+        if n == 0 or total <= 0:
+            raise ValueError("weights must have a positive sum")
+
+        # Vose's construction: pair each underfull column with an
+        # overfull one that tops it up
+        scaled = weights * (n / total)
+        self.probability = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        while small and large:
+            less = small.pop()
+            more = large[-1]
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(large.pop())
+
+        # Lists are quicker than arrays to index one at a time
+        self.probabilities = self.probability.tolist()
+        self.aliases = self.alias.tolist()
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def sample(self, rng=random):
+        """
+        Returns one index drawn with `rng`, a `random.Random` or the
+        `random` module itself.
+        """
+        i = rng.randrange(len(self.aliases))
+        if rng.random() < self.probabilities[i]:
+            return i
+        return self.aliases[i]
+
+    def sample_many(self, rng, size):
+        """
+        Returns an array of `size` indices drawn with NumPy generator `rng`.
+        """
+        i = rng.integers(len(self.aliases), size=size)
+        return np.where(
+            rng.random(size) < self.probability[i], i, self.alias[i]
+        )
+
+
+class TransitionTables():
+    """
+    The random surfer's transition model for a corpus, precomputed once
+    so that every step costs O(1): with probability `damping_factor`
+    follow a uniformly chosen out-link, otherwise jump to a page drawn
+    from `teleport`. Pages without links always jump.
+    """
+    def __init__(self, corpus, damping_factor, teleport=None):
+        """
+        Build the tables for `corpus`. `teleport` weighs the pages to
+        jump to as in `matrix.teleport_vector`, every page weighing the
+        same if it is None.
+        """
+        self.pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(self.pages)}
+        self.damping_factor = damping_factor
+        self.links = [
+            tuple(sorted(index[link] for link in corpus[page]
+                         if link in index))
+            for page in self.pages
+        ]
+        if teleport is None:
+            self.teleport = AliasTable(np.ones(len(self.pages)))
+        else:
+            self.teleport = AliasTable(
+                teleport_vector(self.pages, teleport)
+            )
+
+        # The same links as CSR arrays, for the vectorized surfers
+        self.out_degree = np.array([len(links) for links in self.links])
+        self.indptr = np.zeros(len(self.pages) + 1, dtype=np.int64)
+        np.cumsum(self.out_degree, out=self.indptr[1:])
+        self.targets = np.fromiter(
+            (link for links in self.links for link in links),
+            dtype=np.int64, count=self.indptr[-1]
+        )
+
+    def __len__(self):
+        return len(self.pages)
+
+    def step(self, page, rng=random):
+        """
+        Returns the page visited after `page`, both as positions.
+        """
+        links = self.links[page]
+        if links and rng.random() < self.damping_factor:
+            return links[rng.randrange(len(links))]
+        return self.teleport.sample(rng)
+
+    def steps(self, pages, rng):
+        """
+        Returns the next position of every surfer in array `pages`,
+        drawing with NumPy generator `rng`.
+        """
+        degree = self.out_degree[pages]
+        follow = (degree > 0) & (rng.random(len(pages)) < self.damping_factor)
+        jumps = self.teleport.sample_many(rng, len(pages))
+        choice = (rng.random(len(pages)) * degree).astype(np.int64)
+        offsets = np.where(follow, self.indptr[pages] + choice, 0)
+        links = self.targets[offsets] if len(self.targets) else jumps
+        return np.where(follow, links, jumps)
+
+
+def sample_counts(tables, n, rng=random):
+    """
+    Returns how often a single surfer visits each page over `n` samples,
+    starting from a page drawn from the teleport distribution.
+    """
+    counts = [0] * len(tables)
+    step = tables.step
+    page = tables.teleport.sample(rng)
+    counts[page] += 1
+    for _ in range(n - 1):
+        page = step(page, rng)
+        counts[page] += 1
+    return counts
+
+
+def burn_in(damping_factor):
+    """
+    Returns how many steps a surfer starting from the teleport
+    distribution walks before its distance from the stationary
+    distribution is at most `BIAS`. Every step teleports with
+    probability 1 - `damping_factor`, which shrinks that distance by at
+    least `damping_factor`.
+    """
+    if damping_factor <= 0:
+        return 0
+    if damping_factor >= 1:
+        return MAX_BURN_IN
+    return min(MAX_BURN_IN, math.ceil(
+        math.log(BIAS) / math.log(damping_factor)
+    ))
+
+
+def surf_counts(tables, n, surfers, rng):
+    """
+    Returns visit counts for at least `n` samples taken by `surfers`
+    independent surfers moving in lockstep, drawing with NumPy generator
+    `rng`. Each surfer takes the same number of steps, so the total is
+    `n` rounded up to a multiple of `surfers`.
+
+    A walk that has just started is biased towards the teleport
+    distribution, and short walks would count mostly biased steps, so
+    every surfer first walks `burn_in` uncounted steps.
+    """
+    surfers = max(1, min(surfers, n))
+    pages = tables.teleport.sample_many(rng, surfers)
+    for _ in range(burn_in(tables.damping_factor)):
+        pages = tables.steps(pages, rng)
+    counts = np.bincount(pages, minlength=len(tables))
+    for _ in range(-(-n // surfers) - 1):
+        pages = tables.steps(pages, rng)
+        counts += np.bincount(pages, minlength=len(tables))
+    return counts
+
+
+def monte_carlo(corpus, damping_factor, n, workers=None, seed=None,
+                batch=10000, surfers=None, tolerance=None):
+    """
+    Returns (counts, intervals) from up to `n` samples split into
+    independent batches of `batch` samples, run on a pool of `workers`
+    processes. Batches are seeded from one SeedSequence in a fixed order
+    and merged in that order, so a given `seed` gives the same result
+    whatever the number of workers.
+
+    `intervals` holds the half-width of a 95% confidence interval for
+    each page's rank, from the spread of the batch means. Sampling stops
+    after the first batch that brings all of them within `tolerance`,
+    once at least `MIN_BATCHES` batches have been taken.
+
+    Every surfer in a batch starts afresh and walks its `burn_in` steps
+    before counting, so by default each then takes 100 counted steps.
+    """
+    if surfers is None:
+        surfers = max(1, batch // 100)
+    tables = TransitionTables(corpus, damping_factor)
+    sequence = np.random.SeedSequence(seed)
+    batches = max(1, -(-n // batch))
+    workers = workers or os.cpu_count()
+    counts = np.zeros(len(tables), dtype=np.int64)
+    means = BatchMeans(len(tables))
+
+    with Pool(workers, initializer=use_tables,
+              initargs=(tables,)) as pool:
+        while means.batches < batches:
+            seeds = sequence.spawn(min(workers, batches - means.batches))
+            for batch_counts in pool.map(
+                    sample_batch, [(s, batch, surfers) for s in seeds]):
+                counts += batch_counts
+                means.add(batch_counts / batch_counts.sum())
+                if tolerance is not None and \
+                        means.batches >= MIN_BATCHES and \
+                        means.intervals().max() <= tolerance:
+                    return counts, means.intervals()
+
+    return counts, means.intervals()
+
+
+class BatchMeans():
+    """
+    Running mean and variance of per-batch rank estimates.
+    """
+    def __init__(self, n):
+        self.batches = 0
+        self.total = np.zeros(n)
+        self.squares = np.zeros(n)
+
+    def add(self, frequencies):
+        self.batches += 1
+        self.total += frequencies
+        self.squares += frequencies ** 2
+
+    def intervals(self):
+        """
+        Returns the half-width of the 95% confidence interval of each
+        mean, infinite with fewer than two batches. The batch variance is
+        itself estimated, so the interval uses Student's t distribution.
+        """
+        b = self.batches
+        if b < 2:
+            return np.full(len(self.total), np.inf)
+        variance = (self.squares - self.total ** 2 / b) / (b - 1)
+        return t_critical(b - 1) * np.sqrt(np.maximum(variance, 0) / b)
+
+
+def t_critical(df):
+    """
+    Returns the critical value of Student's t distribution with `df`
+    degrees of freedom for a two-sided 95% confidence interval, by the
+    Cornish-Fisher expansion about `Z` (Abramowitz and Stegun 26.7.5),
+    which is within 0.005 of it from 3 degrees of freedom up.
+    """
+    if df in T:
+        return T[df]
+    z = Z
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z)
+        / (384 * df ** 3)
+        + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3
+           - 945 * z) / (92160 * df ** 4)
+    )
+
+
+def use_tables(tables):
+    """
+    Pool initializer keeping `tables` for the batches this process runs.
+    """
+    global worker_tables
+    worker_tables = tables
+
+
+def sample_batch(args):
+    """
+    Returns the visit counts of one batch, given its seed, its number of
+    samples and how many surfers take them.
+    """
+    seed, n, surfers = args
+    return surf_counts(worker_tables, n, surfers, np.random.default_rng(seed))
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import crawler
+import graphfile
+from benchmark import random_graph, to_corpus
+from pagerank import (
+    DAMPING, SAMPLES, iterate_mapped_pagerank, iterate_pagerank,
+    sample_pagerank
+)
+
+# A stage this much slower than in the baseline counts as a regression
+REGRESSION = 1.25
+
+# Differences in seconds smaller than this are treated as timing noise
+NOISE = 0.01
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time crawling, sampling and iteration on synthetic "
+                    "corpora, optionally against a stored baseline."
+    )
+    parser.add_argument("--graphs", nargs="+", choices=list(GENERATORS),
+                        default=list(GENERATORS))
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--degree", type=int, default=8,
+                        help="average number of links per page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="take the best time of this many runs")
+    parser.add_argument("--html", action="store_true",
+                        help="also write the corpora as HTML files and "
+                             "time crawling them")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline",
+                        help="compare against results saved earlier")
+    args = parser.parse_args()
+
+    config = {
+        "pages": args.pages, "degree": args.degree, "seed": args.seed,
+        "samples": SAMPLES,
+    }
+    results = {}
+    for name in args.graphs:
+        corpus = generate(name, args.pages, args.degree, args.seed)
+        links = sum(len(links) for links in corpus.values())
+        print(f"{name}: {len(corpus):,} pages, {links:,} links")
+        results[name] = run(corpus, args.repeat, args.html)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"Wrote {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            print(f"Warning: {args.baseline} was run with "
+                  f"{baseline['config']}")
+        if compare(results, baseline["results"]):
+            sys.exit("Slower than the baseline")
+
+
+def run(corpus, repeat=3, html=False):
+    """
+    Returns the time and peak memory of each stage on `corpus`, printing
+    them as they are measured.
+    """
+    stages = {
+        "sample": lambda: sample_pagerank(corpus, DAMPING, SAMPLES),
+        "sample_surfers": lambda: sample_pagerank(
+            corpus, DAMPING, 100 * SAMPLES, surfers=1000
+        ),
+        "iterate": lambda: iterate_pagerank(corpus, DAMPING),
+        "iterate_tight": lambda: iterate_pagerank(corpus, DAMPING, 1e-10),
+    }
+    results = {}
+    for stage, function in stages.items():
+        results[stage] = report(stage, measure(function, repeat))
+    if not html:
+        return results
+
+    directory = tempfile.mkdtemp(prefix="pagerank-")
+    try:
+        write_html(corpus, directory)
+        # Each run starts without the link cache or graph file
+        stages = {
+            "crawl": lambda: crawler.crawl(directory),
+            "iterate_mapped": lambda: iterate_mapped_pagerank(
+                directory, os.path.join(directory, graphfile.FILENAME),
+                DAMPING
+            ),
+        }
+        for stage, function in stages.items():
+            results[stage] = report(stage, measure(
+                function, repeat, lambda: clean(directory)
+            ))
+        cache = os.path.join(directory, crawler.FILENAME)
+        crawler.crawl(directory, cache=cache)
+        results["crawl_cached"] = report("crawl_cached", measure(
+            lambda: crawler.crawl(directory, cache=cache), repeat
+        ))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def measure(function, repeat=3, setup=None):
+    """
+    Returns the best wall time of `repeat` calls to `function`, and the
+    peak memory traced during one more call, as a dictionary. `setup` is
+    called before each of them.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    # Tracing slows everything down, so memory gets a run of its own
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mib": peak / 2 ** 20}
+
+
+def report(stage, result):
+    """
+    Prints and returns the `result` of `stage`.
+    """
+    print(
+        f"  {stage:>15}: {result['seconds']:8.3f}s "
+        f"{result['peak_mib']:8.1f} MiB peak"
+    )
+    return result
+
+
+def compare(results, baseline):
+    """
+    Prints each stage's time and peak memory relative to `baseline` and
+    returns how many stages got slower by more than `REGRESSION`, and by
+    more than `NOISE` seconds.
+    """
+    regressions = 0
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            before = baseline.get(name, {}).get(stage)
+            if before is None:
+                continue
+            speed = result["seconds"] / before["seconds"]
+            memory = result["peak_mib"] / max(before["peak_mib"], 1e-9)
+            slower = speed > REGRESSION and \
+                result["seconds"] - before["seconds"] > NOISE
+            regressions += slower
+            print(
+                f"{name:>12} {stage:>15}: {speed:5.2f}x time, "
+                f"{memory:5.2f}x memory{'  SLOWER' if slower else ''}"
+            )
+    return regressions
+
+
+# Options for `benchmark.random_graph` making each kind of corpus
+GENERATORS = {
+    "erdos-renyi": {"dangling": 0.0, "uniform": True},
+    "power-law": {"dangling": 0.1},
+    "dangling": {"dangling": 0.5, "uniform": True},
+}
+
+
+def generate(name, n, degree, seed=0):
+    """
+    Returns a corpus of the kind `name` in `GENERATORS` with `n` pages
+    and about `degree` links per page.
+    """
+    return to_corpus(*random_graph(n, n * degree, seed=seed,
+                                   **GENERATORS[name]))
+
+
+def write_html(corpus, directory):
+    """
+    Writes each page of `corpus` to `directory` as an HTML file linking
+    to its pages.
+    """
+    for page, links in corpus.items():
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<head>\n<title>{page}"
+                    f"</title>\n</head>\n<body>\n<h1>{page}</h1>\n")
+            for link in sorted(links):
+                f.write(f'<div><a href="{link}">{link}</a></div>\n')
+            f.write("</body>\n</html>\n")
+
+
+def clean(directory):
+    """
+    Removes the link cache and graph file from `directory`.
+    """
+    for name in (crawler.FILENAME, graphfile.FILENAME):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()